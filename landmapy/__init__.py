@@ -1,8 +1,22 @@
 """
 Package landmapy.
 
+Submodules are imported on first attribute access (`landmapy.reflect`),
+and heavy dependencies inside the functions that use them,
+so `import landmapy` stays fast.
+
 Functions:
-    cached.cached(func_key, override)
+    cached.cache_entries()
+    cached.cache_hash(*args, **kwargs)
+    cached.cache_stats()
+    cached.cached(func_key, override, hash_args, storage, lazy, memory, versioned, depends, codec)
+    cached.clear_memory(func_key)
+    cached.code_fingerprint(function, depends)
+    cached.configure_cache(**settings)
+    cached.jars_dir()
+    cached.prune_cache(quota_bytes, ttl_seconds, dry_run, keep)
+    cached.reset_cache_stats()
+    cached.warm_cache(tasks, max_workers)
     cdcplaces.download_census_tract(tract_path, placename)
     cdcplaces.download_cdc_disease(data_dir)
     cdcplaces.join_tract_cdc(place_tract_gdf, cdc_df)
@@ -11,6 +25,12 @@ Functions:
     check.check_naip_tracts(naip_index_path, naip_scenes_df)
     check.get_last_row_csv(file_path)
     check.header_csv(file_path)
+    earthaccess.earthaccess_login(persist)
+    earthaccess.get_earthaccess_links(results, open_files)
+    earthaccess.granule_links(index_gdf)
+    earthaccess.query_granule_index(aoi_gdf, dates, index_path, max_cloud_cover, min_overlap)
+    earthaccess.search_earthaccess(delta_gdf, dates, max_cloud_cover, min_overlap)
+    earthaccess.update_granule_index(aoi_gdf, dates, index_path)
     explore.index_tree(redlining_index_gdf)
     explore.ramp_logic(data, up, down)
     explore.train_test(model_df)
@@ -37,7 +57,10 @@ Functions:
     hvplot.hvplot_tract_gdf(place_tract_gdf)
     hvplot.hvplot_train_test(y_test)
     initial.create_data_dir(new_dir)
+    initial.gdal_profile(profile, **settings)
+    initial.get_preview()
     initial.robust_code()
+    initial.set_preview(factor)
     naip.check_element_in_csv(filename, column_name, target_value)
     naip.download_naip_scenes(naip_index_path, tract_cdc_gdf)
     naip.merge_ndvi_cdc(tract_cdc_gdf, ndvi_index_df)
@@ -54,24 +77,58 @@ Functions:
     plot.plot_train_test(y_test)
     polaris.merge_soil(place_gdf, soil_var, soil_sum=, soil_depth, buffer)
     polaris.soil_url_dict(place_gdf, soil_var, soil_sum, soil_depth)
+    pipeline.pipeline(items, read_function, compute_function, io_workers, compute_workers, max_queue)
     process.clip_gdf_da_bounds(place_gdf, da, buffer)
-    process.da2gdf(data_array)
-    process.process_bands(city_gdf, raster_df)
+    process.da2gdf(data_array, block_size, bins, out_path)
+    process.open_raster(uri, preview, overviews, **options)
+    process.process_bands(city_gdf, raster_df, max_workers)
     process.process_cloud_mask(cloud_uri, bounds_gdf, bits_to_mask)
-    process.process_image(uri, bounds_gdf)
+    process.process_image(uri, bounds_gdf, resolution, overviews)
     process.process_metadata(city_files)
+    qa.bitmask(bits)
+    qa.qa_mask(qa, bits, lut)
     redline.redline_gdf(data_dir)
     redline.redline_index_gdf(redlining_gdf, index_stats)
     redline.redline_mask(place_gdf, index_da)
-    reflect.compute_reflectance_da(search_results, boundary_gdf)
-    reflect.merge_and_composite_arrays(granule_da_df)
+    reflect.compute_reflectance_da(search_results, boundary_gdf, hash_args, io_workers, compute_workers, max_queue)
+    reflect.merge_and_composite_arrays(granule_da_df, hash_args, lazy)
     reflect.read_delta_gdf(huc_level, watershed)
     reflect.read_wbd_file(wbd_filename, huc_level, cache_key)
     reflect.reflectance_kmeans(reflectance_da)
     reflect.reflectance_range(model_df)
     reflect.reflectance_rgb(reflectance_da)
-    srtm.srtm_download(place_gdf, elevation_dir, buffer)
-    srtm.srtm_slope(srtm_da)
+    reflect.warm_delta_cache(watersheds, huc_regions, huc_level, dates, composite, max_workers)
+    srtm.srtm_download(place_gdf, elevation_dir, buffer, vrt, chunks)
+    srtm.srtm_slope(srtm_da, UTM)
+    srtm.srtm_tiles(bounds)
+    srtm.srtm_vrt(srtm_paths, vrt_path)
+    terrain.terrain_derivatives(dem_da, derivatives, crs, chunks, reproject_back, azimuth, altitude)
+    terrain.utm_crs(da)
     thredds.maca_year(maca_df, row, year)
     thredds.process_maca(sites, scenarios, climates, years, buffer)
-"""
\ No newline at end of file
+"""
+
+def __getattr__(name):
+    """
+    Import a submodule on first attribute access.
+
+    Args:
+        name (str): attribute name, such as 'reflect'
+    Returns:
+        module (module): the imported submodule
+    """
+    import importlib
+    import pkgutil
+
+    if name in {module.name for module in pkgutil.iter_modules(__path__)}:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__():
+    """
+    List submodules along with module attributes.
+    """
+    import pkgutil
+
+    return sorted(set(globals()) | {
+        module.name for module in pkgutil.iter_modules(__path__)})
@@ -1,19 +1,1143 @@
-def cached(func_key, override=False):
+"""
+Cached Functions.
+
+cached: A decorator to cache function results
+cache_hash: Stable hash of function arguments for content-addressed keys
+code_fingerprint: Hash of function source, landmapy version and dependencies
+configure_cache: Set module-wide cache settings
+clear_memory: Invalidate results held in the in-process memory tier
+jars_dir: Directory holding cached files
+cache_entries: List cached entries from the manifest without loading them
+prune_cache: Evict cached entries by age and size quota
+cache_stats: Hits, misses, timings and bytes moved for each `func_key`
+reset_cache_stats: Reset the counters of `cache_stats`
+warm_cache: Run cached functions in parallel to pre-populate the cache
+"""
+import threading
+from collections import OrderedDict
+
+# Module-wide settings used when decorator arguments are left as `None`.
+CACHE_CONFIG = {
+    'hash_args': False,
+    'versioned': False,
+    'codec': None,
+    'codec_level': None,
+    'storage': 'auto',
+    'lazy': False,
+    'memory': False,
+    'memory_bytes': 2**30,
+    'jars_dir': None,
+    'quota_bytes': None,
+    'ttl_seconds': None,
+    'log_events': False,
+}
+
+# Manifest of cached entries in the `jars` directory.
+MANIFEST_NAME = 'manifest.json'
+
+# Log of disk hits, appended without locking and folded into the manifest
+# on the next write or prune.
+HITS_NAME = '.manifest.hits'
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on platforms without `fcntl` (Windows).
+    fcntl = None
+
+# In-process LRU memory tier: cache key -> (result, size in bytes).
+_MEMORY = OrderedDict()
+_MEMORY_LOCK = threading.RLock()
+
+# Counters for `cache_stats`: func_key -> dict of STAT_FIELDS.
+STAT_FIELDS = ('memory_hits', 'hits', 'misses', 'overrides',
+               'compute_seconds', 'load_seconds', 'write_seconds',
+               'bytes_read', 'bytes_written')
+_STATS = {}
+_STATS_LOCK = threading.Lock()
+
+# File suffix for each storage backend, in the order searched on load.
+STORAGE_SUFFIXES = {
+    'zarr': '.zarr',
+    'netcdf': '.nc',
+    'parquet': '.parquet',
+    'pickle': '.pickle',
+    'pickle-zstd': '.pickle.zst',
+    'pickle-lz4': '.pickle.lz4',
+}
+
+# Compression codecs for cached payloads.
+CODECS = ('zstd', 'lz4')
+
+# Variable attributes that xarray would decode (mask or scale) on read;
+# stored under a 'landmapy' prefix so results read back unchanged.
+CF_ATTRS = ('_FillValue', 'missing_value', 'scale_factor', 'add_offset')
+
+def configure_cache(**settings):
+    """
+    Set module-wide cache settings.
+
+    Settings not named keep their current values.
+    Decorator arguments left as `None` fall back to these settings.
+
+    Args:
+      settings (dict): Names and values of entries in `CACHE_CONFIG`
+    Returns:
+      config (dict): Copy of the updated settings
+    """
+    unknown = set(settings) - set(CACHE_CONFIG)
+    if unknown:
+        raise ValueError(f'Unknown cache settings: {sorted(unknown)}')
+    CACHE_CONFIG.update(settings)
+    # Shrink the memory tier to a lowered budget
+    _memory_put(None, None)
+    return dict(CACHE_CONFIG)
+
+# configure_cache(hash_args=True, memory_bytes=2**29)
+
+def clear_memory(func_key=None):
+    """
+    Invalidate results held in the in-process memory tier.
+
+    Files in the `jars` directory are left alone.
+
+    Args:
+      func_key (str, optional): Only drop keys built from this `func_key`;
+        `None` drops everything
+    Returns:
+      keys (list of str): cache keys dropped
+    """
+    with _MEMORY_LOCK:
+        keys = [key for key in _MEMORY
+                if func_key is None or key == func_key
+                or key.startswith(f'{func_key}_')]
+        for key in keys:
+            del _MEMORY[key]
+    return keys
+
+# clear_memory('wbd_08')
+
+def cache_stats():
+    """
+    Hits, misses, timings and bytes moved for each `func_key`.
+
+    Counts are for this process since import or `reset_cache_stats()`.
+    Hits are loads from the `jars` directory; memory hits skip the disk.
+    Misses and overrides both compute; their time is in `compute_seconds`
+    and the time to store results in `write_seconds`.
+
+    Returns:
+      stats_df (df): one row per `func_key` with columns of `STAT_FIELDS`
+    """
+    import pandas as pd
+
+    with _STATS_LOCK:
+        stats_df = pd.DataFrame.from_dict(
+            {key: dict(stats) for key, stats in _STATS.items()},
+            orient='index', columns=list(STAT_FIELDS))
+    stats_df.index.name = 'func_key'
+    return stats_df
+
+# cache_stats()
+
+def reset_cache_stats():
+    """
+    Reset the counters of `cache_stats`.
+    """
+    with _STATS_LOCK:
+        _STATS.clear()
+
+def _record_event(func_key, key, event, **counts):
+    """
+    Add one cache event to the counters and optionally log it (internal).
+
+    With `CACHE_CONFIG['log_events']`, each event is logged at INFO level
+    to the 'landmapy.cached' logger, with a `cache_event` dict attribute
+    on the log record for structured handlers.
+
+    Args:
+      func_key (str): `func_key` of the decorator
+      key (str): full cache key
+      event (str): 'memory_hit', 'hit', 'miss' or 'override'
+      counts (dict): amounts to add to fields of `STAT_FIELDS`
+    """
+    import logging
+
+    with _STATS_LOCK:
+        stats = _STATS.setdefault(func_key, dict.fromkeys(STAT_FIELDS, 0))
+        stats['misses' if event == 'miss' else f'{event}s'] += 1
+        for field, amount in counts.items():
+            stats[field] += amount
+    if CACHE_CONFIG['log_events']:
+        logging.getLogger(__name__).info(
+            'cache %s %s %s', event, key,
+            ' '.join(f'{field}={amount:.6g}' for field, amount in counts.items()),
+            extra=dict(cache_event=dict(
+                event=event, func_key=func_key, key=key, **counts)))
+
+def warm_cache(tasks, max_workers=4):
+    """
+    Run cached functions in parallel to pre-populate the cache.
+
+    Each task is a dict with `function` and optional `args`, `kwargs`
+    and `name`, or a tuple `(function, args, kwargs)`.
+    Tasks run in a thread pool; tasks sharing a cache key compute only once
+    thanks to the per-key file lock, and a failed task does not stop the rest.
+    Cache entries written during the run are printed at the end.
+
+    Args:
+      tasks (list): functions and arguments to run
+      max_workers (int, optional): number of tasks to run at once
+    Returns:
+      report_df (df): one row per task with name, status, seconds and error
+    """
+    import time
+    import pandas as pd
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run_task(task):
+        """Run one task, capturing its status and time."""
+        if not isinstance(task, dict):
+            task = dict(zip(('function', 'args', 'kwargs'), task))
+        name = task.get('name', getattr(task['function'], '__name__', str(task['function'])))
+        start = time.perf_counter()
+        try:
+            task['function'](*task.get('args', ()), **task.get('kwargs', {}))
+            status, error = 'done', None
+        except Exception as exception:
+            status, error = 'failed', repr(exception)
+        return dict(name=name, status=status,
+                    seconds=time.perf_counter() - start, error=error)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        rows = list(executor.map(run_task, tasks))
+    report_df = pd.DataFrame(rows, columns=['name', 'status', 'seconds', 'error'])
+
+    # Report the entries built during this run
+    entries_df = cache_entries()
+    built_df = entries_df[entries_df.created >= pd.to_datetime(start, unit='s')]
+    print(f'Built {len(built_df)} cache entries:')
+    for key, nbytes in zip(built_df.key, built_df.bytes):
+        print(f'  {key} ({nbytes / 2**20:.1f} MiB)')
+    return report_df
+
+# report_df = warm_cache([(read_wbd_file, ('WBD_08_HU2_Shape', 12), dict(func_key='wbd_08'))])
+
+def jars_dir():
+    """
+    Directory holding cached files.
+
+    Uses `CACHE_CONFIG['jars_dir']` if set,
+    else `jars` in the earthpy data directory under `HOME`.
+
+    Returns:
+      path (str): directory path
+    """
+    import os
+
+    if CACHE_CONFIG['jars_dir'] is not None:
+        return CACHE_CONFIG['jars_dir']
+    import earthpy as et
+    return os.path.join(et.io.HOME, et.io.DATA_NAME, 'jars')
+
+def cache_entries():
+    """
+    List cached entries from the manifest without loading them.
+
+    Files in the `jars` directory missing from the manifest,
+    such as pickles written before the manifest existed,
+    are listed from their file system times with no hits.
+
+    The compression `ratio` is uncompressed over stored bytes,
+    where uncompressed is the pickle stream or the in-memory size.
+
+    Returns:
+      entries_df (df): one row per cache key with columns
+        file, storage, func_key, bytes, raw_bytes, ratio,
+        write_seconds, load_seconds, created, last_access and hits
+    """
+    import pandas as pd
+
+    manifest = _manifest_scan()
+    columns = ['key', 'file', 'storage', 'func_key', 'bytes', 'raw_bytes',
+               'write_seconds', 'load_seconds', 'created', 'last_access', 'hits']
+    entries_df = pd.DataFrame(
+        [dict(key=key, **entry) for key, entry in manifest.items()],
+        columns=columns)
+    entries_df.insert(
+        columns.index('raw_bytes') + 1, 'ratio',
+        pd.to_numeric(entries_df.raw_bytes) / pd.to_numeric(entries_df.bytes))
+    for column in ['created', 'last_access']:
+        entries_df[column] = pd.to_datetime(entries_df[column], unit='s')
+    return entries_df.sort_values('last_access').reset_index(drop=True)
+
+# cache_entries()
+
+def prune_cache(quota_bytes=None, ttl_seconds=None, dry_run=False, keep=()):
+    """
+    Evict cached entries by age and size quota.
+
+    Entries not accessed within `ttl_seconds` are removed first,
+    then least recently accessed entries until the total fits `quota_bytes`.
+    Evicted keys are also dropped from the memory tier,
+    and their lock files are removed.
+
+    Args:
+      quota_bytes (int, optional): Byte quota; `None` uses `CACHE_CONFIG['quota_bytes']`
+      ttl_seconds (float, optional): Maximum age since last access;
+        `None` uses `CACHE_CONFIG['ttl_seconds']`
+      dry_run (bool, optional): When True, only report what would be removed
+      keep (list of str, optional): cache keys never to evict
+    Returns:
+      evicted_df (df): rows of `cache_entries()` that were (or would be) removed
+    """
+    import os
+    import time
+
+    if quota_bytes is None:
+        quota_bytes = CACHE_CONFIG['quota_bytes']
+    if ttl_seconds is None:
+        ttl_seconds = CACHE_CONFIG['ttl_seconds']
+
+    entries_df = cache_entries()
+    last_access = entries_df.last_access.astype('int64') / 1e9
+    evict = entries_df.key.isin([])
+    kept = entries_df.key.isin(list(keep))
+    if ttl_seconds is not None:
+        evict |= last_access < time.time() - ttl_seconds
+    if quota_bytes is not None:
+        # Entries are sorted by last access, so the oldest go first;
+        # entries in `keep` count against the quota before any other.
+        kept_bytes = entries_df.bytes.where(~evict & ~kept, 0)[::-1].cumsum()[::-1]
+        evict |= kept_bytes + entries_df.bytes[kept].sum() > quota_bytes
+    evict &= ~kept
+    evicted_df = entries_df[evict].reset_index(drop=True)
+
+    if not dry_run and len(evicted_df):
+        directory = jars_dir()
+        with _file_lock(os.path.join(directory, MANIFEST_NAME)):
+            manifest, folded = _manifest_compact()
+            for key, file in zip(evicted_df.key, evicted_df.file):
+                _remove_cached(os.path.join(directory, file))
+                manifest.pop(key, None)
+                with _MEMORY_LOCK:
+                    _MEMORY.pop(key, None)
+            _manifest_save(manifest, folded)
+
+        # Remove the lock files of evicted keys, each under its own lock
+        for key in evicted_df.key:
+            with _file_lock(os.path.join(directory, key), remove=True):
+                pass
+    return evicted_df
+
+# prune_cache(quota_bytes=50 * 2**30, ttl_seconds=30 * 86400)
+
+def _path_bytes(path):
+    """
+    Size of a file, or of all files under a Zarr directory (internal).
+
+    Args:
+      path (str): file or directory path
+    Returns:
+      nbytes (int): size in bytes
+    """
+    import os
+
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names)
+
+def _manifest_load():
+    """
+    Read the manifest of cached entries (internal).
+
+    Returns:
+      manifest (dict): cache key -> entry dict
+    """
+    import os
+    import json
+
+    path = os.path.join(jars_dir(), MANIFEST_NAME)
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _manifest_save(manifest, folded=()):
+    """
+    Write the manifest of cached entries, replacing the old one whole (internal).
+
+    Args:
+      manifest (dict): cache key -> entry dict
+      folded (list of str, optional): hit logs now in the manifest, removed after the write
+    """
+    import os
+    import json
+
+    path = os.path.join(jars_dir(), MANIFEST_NAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.{os.getpid()}.tmp', 'w') as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(f'{path}.{os.getpid()}.tmp', path)
+    for log_path in folded:
+        if os.path.exists(log_path):
+            os.remove(log_path)
+
+def _manifest_compact():
+    """
+    Manifest with all logged hits folded in, for a write (internal).
+
+    Call with the manifest lock held. The hit log is first moved aside,
+    so hits logged meanwhile go to a new log and are not lost;
+    pass the returned logs to `_manifest_save` to remove them.
+
+    Returns:
+      manifest (dict): cache key -> entry dict
+      folded (list of str): hit logs folded into the manifest
+    """
+    import os
+    import uuid
+    from glob import glob, escape
+
+    hits_path = os.path.join(jars_dir(), HITS_NAME)
+    if os.path.exists(hits_path):
+        os.replace(hits_path, f'{hits_path}.{uuid.uuid4().hex}.taken')
+    folded = glob(f'{escape(hits_path)}.*.taken')
+    return _manifest_scan(folded), folded
+
+def _manifest_scan(hit_logs=None):
+    """
+    Manifest reconciled with the files in the `jars` directory (internal).
+
+    Entries whose files are gone are dropped,
+    and files with no entry are added from their file system times.
+    Disk hits from the hit logs are then counted in.
+
+    Args:
+      hit_logs (list of str, optional): hit logs to fold in (default all)
+    Returns:
+      manifest (dict): cache key -> entry dict
+    """
+    import os
+    import json
+    from glob import glob, escape
+
+    directory = jars_dir()
+    manifest = _manifest_load()
+    names = os.listdir(directory) if os.path.isdir(directory) else []
+    # Skip hidden temporaries of writes in progress
+    names = [name for name in names if not name.startswith('.')]
+    manifest = {key: entry for key, entry in manifest.items()
+                if entry['file'] in names}
+    known = {entry['file'] for entry in manifest.values()}
+    for name in names:
+        for storage, suffix in STORAGE_SUFFIXES.items():
+            if name.endswith(suffix) and name not in known:
+                stat = os.stat(os.path.join(directory, name))
+                manifest[name[:-len(suffix)]] = dict(
+                    file=name, storage=storage, func_key=None,
+                    bytes=_path_bytes(os.path.join(directory, name)),
+                    created=stat.st_mtime, last_access=stat.st_mtime, hits=0)
+                break
+
+    # Count logged disk hits
+    if hit_logs is None:
+        hits_path = os.path.join(directory, HITS_NAME)
+        hit_logs = glob(f'{escape(hits_path)}.*.taken') + [hits_path]
+    for log_path in hit_logs:
+        try:
+            with open(log_path) as file:
+                lines = file.read().splitlines()
+        except FileNotFoundError:
+            continue
+        for line in lines:
+            try:
+                hit = json.loads(line)
+            except ValueError:
+                # Line still being written
+                continue
+            entry = manifest.get(hit['key'])
+            if entry is not None:
+                entry.update(last_access=max(entry['last_access'], hit['time']),
+                             hits=entry['hits'] + 1, load_seconds=hit['seconds'])
+    return manifest
+
+def _manifest_record(key, path, func_key=None, hit=False, seconds=None,
+                     raw_bytes=None):
+    """
+    Record a write or a disk hit for a cache key in the manifest (internal).
+
+    A hit is one line appended to the hit log, with no lock
+    and no rewrite of the manifest, so parallel readers do not wait
+    on each other; hits are folded into the manifest on the next write.
+
+    Args:
+      key (str): cache key
+      path (str): stored file
+      func_key (str, optional): `func_key` of the decorator
+      hit (bool): When True, count a hit; otherwise record a new write
+      seconds (float, optional): time to load (hit) or write the file
+      raw_bytes (int, optional): uncompressed size of a write
+    Returns:
+      entry (dict): manifest entry for the key (for a hit, as of the last write)
+    """
+    import os
+    import json
+    import time
+
+    now = time.time()
+    directory = jars_dir()
+    if hit:
+        # One short append is atomic, so concurrent hits do not interleave
+        with open(os.path.join(directory, HITS_NAME), 'a') as file:
+            file.write(json.dumps(dict(key=key, time=now, seconds=seconds)) + '\n')
+        entry = _manifest_load().get(key)
+        if entry is None:
+            entry = dict(bytes=_path_bytes(path))
+        return entry
+
+    with _file_lock(os.path.join(directory, MANIFEST_NAME)):
+        manifest, folded = _manifest_compact()
+        storage = next(name for name, suffix in STORAGE_SUFFIXES.items()
+                       if path.endswith(suffix))
+        manifest[key] = dict(
+            file=os.path.basename(path), storage=storage, func_key=func_key,
+            bytes=_path_bytes(path), raw_bytes=raw_bytes,
+            write_seconds=seconds, load_seconds=None,
+            created=now, last_access=now, hits=0)
+        _manifest_save(manifest, folded)
+    return manifest[key]
+
+def _sizeof(result, path=None):
+    """
+    Estimate the in-memory size of a result (internal).
+
+    Args:
+      result (object): result of the compute function
+      path (str, optional): stored file, used for objects of other types
+    Returns:
+      nbytes (int): estimated size in bytes
+    """
+    import os
+    import sys
+
+    module = type(result).__module__.split('.')[0]
+    if module in ('pandas', 'geopandas') and hasattr(result, 'memory_usage'):
+        columns = result.items() if hasattr(result, 'columns') else [(None, result)]
+        nbytes = result.index.memory_usage(deep=True)
+        for _, column in columns:
+            nbytes += column.memory_usage(index=False, deep=True)
+            if str(column.dtype) == 'geometry':
+                # Only pointers are counted; add 16 bytes per x, y pair.
+                import numpy as np
+                import shapely
+                nbytes += 16 * int(shapely.get_num_coordinates(np.asarray(column)).sum())
+            elif column.dtype == object:
+                # Arrays and DataArrays in cells count their data.
+                nbytes += sum(_sizeof(value) for value in column
+                              if hasattr(value, 'nbytes'))
+        return int(nbytes)
+    if module == 'xarray':
+        # Count only data already in memory, not lazily opened variables.
+        if hasattr(result, 'data_vars'):
+            variables = list(result.variables.values())
+        else:
+            variables = [result.variable, *result.coords.variables.values()]
+        return int(sum(variable.nbytes for variable in variables
+                       if getattr(variable, '_in_memory', True)))
+    if module == 'numpy':
+        return int(result.nbytes)
+    if path is not None and os.path.isfile(path):
+        return os.path.getsize(path)
+    return sys.getsizeof(result)
+
+def _memory_get(key):
+    """
+    Look up a cache key in the memory tier (internal).
+
+    Args:
+      key (str): cache key
+    Returns:
+      found (bool), result (object): whether found, and the result
+    """
+    with _MEMORY_LOCK:
+        if key not in _MEMORY:
+            return False, None
+        _MEMORY.move_to_end(key)
+        return True, _MEMORY[key][0]
+
+def _memory_put(key, result, path=None):
+    """
+    Add a result to the memory tier and evict down to budget (internal).
+
+    Results larger than the whole budget are not held.
+    With `key=None`, only evict.
+
+    Args:
+      key (str): cache key
+      result (object): result of the compute function
+      path (str, optional): stored file, used to size the result
+    """
+    budget = CACHE_CONFIG['memory_bytes']
+    with _MEMORY_LOCK:
+        if key is not None:
+            _MEMORY.pop(key, None)
+            nbytes = _sizeof(result, path)
+            if nbytes <= budget:
+                _MEMORY[key] = (result, nbytes)
+        total = sum(nbytes for _, nbytes in _MEMORY.values())
+        while total > budget and _MEMORY:
+            _, (_, nbytes) = _MEMORY.popitem(last=False)
+            total -= nbytes
+
+def cache_hash(*args, **kwargs):
+    """
+    Stable hash of function arguments.
+
+    GeoDataFrames hash their geometry WKB, CRS and attribute columns.
+    DataArrays hash their dims, coords, attrs and a strided sample of the data.
+    Earthaccess granules hash their granule IDs.
+    Other objects fall back to their pickle or `repr`.
+    The `cache_key` keyword is left out as it already names the file.
+
+    Args:
+      args (list): Positional arguments for the compute function
+      kwargs (list): Keyword arguments for the compute function
+    Returns:
+      digest (str): Hexadecimal SHA-256 digest
+    """
+    import hashlib
+
+    hasher = hashlib.sha256()
+    _hash_update(hasher, args)
+    _hash_update(hasher, {key: value for key, value in kwargs.items()
+                          if key != 'cache_key'})
+    return hasher.hexdigest()
+
+# cache_hash(search_results, boundary_gdf)
+
+def code_fingerprint(function, depends=()):
+    """
+    Hash of function source, landmapy version and dependencies.
+
+    Nested functions are part of the source of their enclosing function.
+    Each item in `depends` may be a function, class or module,
+    hashed by its source, or any other value, hashed by `repr`
+    (for instance a version string or a constant such as a scale factor).
+
+    Args:
+      function (function): function to fingerprint
+      depends (list, optional): further functions, modules or values
+    Returns:
+      digest (str): Hexadecimal SHA-256 digest
+    """
+    import hashlib
+    import inspect
+    from importlib.metadata import version, PackageNotFoundError
+
+    try:
+        landmapy_version = version('landmapy')
+    except PackageNotFoundError:
+        landmapy_version = 'unknown'
+
+    hasher = hashlib.sha256(landmapy_version.encode())
+    for item in [function, *depends]:
+        if inspect.isfunction(item) or inspect.isclass(item) or inspect.ismodule(item):
+            try:
+                source = inspect.getsource(item)
+            except (OSError, TypeError):
+                # No source file, as for functions defined interactively
+                code = getattr(item, '__code__', None)
+                source = repr(item) if code is None else repr(
+                    (code.co_code, code.co_consts, code.co_names))
+            hasher.update(source.encode())
+        else:
+            hasher.update(repr(item).encode())
+    return hasher.hexdigest()
+
+# code_fingerprint(compute_reflectance_cached, depends=['scale=0.0001'])
+
+def _hash_update(hasher, obj, sample_size=4096):
+    """
+    Update hasher with a stable digest of one object (internal).
+
+    Args:
+      hasher (hashlib hash): hash object to update
+      obj (object): object to hash
+      sample_size (int): approximate number of DataArray values to sample
+    """
+    import pickle
+
+    # Tag each value with its type so that, say, 1 and '1' differ.
+    obj_type = type(obj)
+    hasher.update(f'{obj_type.__module__}.{obj_type.__qualname__}'.encode())
+    module = obj_type.__module__.split('.')[0]
+
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        hasher.update(repr(obj).encode())
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(str(len(obj)).encode())
+        for item in obj:
+            _hash_update(hasher, item, sample_size)
+    elif isinstance(obj, dict) and 'umm' in obj and 'meta' in obj:
+        # Earthaccess `DataGranule` is a dict of CMR metadata.
+        hasher.update(obj['umm']['GranuleUR'].encode())
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=repr):
+            _hash_update(hasher, key, sample_size)
+            _hash_update(hasher, obj[key], sample_size)
+    elif module == 'geopandas':
+        # GeoDataFrame or GeoSeries: CRS, geometry WKB, then attributes.
+        hasher.update(str(obj.crs).encode())
+        for wkb in obj.geometry.to_wkb():
+            hasher.update(b'' if wkb is None else wkb)
+        if hasattr(obj, 'columns'):
+            _hash_update(hasher, obj.drop(columns=obj.geometry.name), sample_size)
+    elif module == 'pandas' and not hasattr(obj, 'values'):
+        # Scalars such as Timestamp, Timedelta and NaT.
+        hasher.update(repr(obj).encode())
+    elif module == 'pandas':
+        import pandas as pd
+        _hash_update(hasher, [str(name) for name in getattr(obj, 'columns', [])])
+        try:
+            hasher.update(pd.util.hash_pandas_object(obj).values.tobytes())
+        except TypeError:
+            # Object columns such as DataArrays are hashed cell by cell.
+            _hash_update(hasher, list(getattr(obj, 'index', [])), sample_size)
+            for value in obj.values.ravel():
+                _hash_update(hasher, value, sample_size)
+    elif module == 'xarray' and hasattr(obj, 'data_vars'):
+        # Dataset: each variable in turn.
+        for name in sorted(obj.data_vars, key=str):
+            _hash_update(hasher, str(name))
+            _hash_update(hasher, obj[name], sample_size)
+    elif module == 'xarray':
+        # DataArray: structure, coords, attrs and a strided data sample.
+        hasher.update(repr((obj.name, obj.dims, obj.shape, str(obj.dtype))).encode())
+        for name in sorted(obj.coords, key=str):
+            coord = obj.coords[name]
+            _hash_update(hasher, str(name))
+            _hash_update(hasher, coord.values, sample_size)
+            _hash_update(hasher, dict(coord.attrs), sample_size)
+        _hash_update(hasher, dict(obj.attrs), sample_size)
+        if obj.ndim:
+            per_dim = max(1, round(sample_size ** (1 / obj.ndim)))
+            sample = obj.isel({
+                dim: slice(None, None, max(1, size // per_dim))
+                for dim, size in zip(obj.dims, obj.shape)})
+        else:
+            sample = obj
+        _hash_update(hasher, sample.values, sample_size)
+    elif module == 'numpy':
+        import numpy as np
+        array = np.asarray(obj)
+        hasher.update(repr((array.shape, str(array.dtype))).encode())
+        if array.dtype == object:
+            for value in array.ravel():
+                _hash_update(hasher, value, sample_size)
+        else:
+            hasher.update(np.ascontiguousarray(array).tobytes())
+    else:
+        try:
+            hasher.update(pickle.dumps(obj, protocol=4))
+        except Exception:
+            hasher.update(repr(obj).encode())
+
+def _auto_storage(result):
+    """
+    Choose a storage backend from the type of result (internal).
+
+    Args:
+      result (object): result of the compute function
+    Returns:
+      storage (str): key of `STORAGE_SUFFIXES`
+    """
+    from importlib.util import find_spec
+
+    module = type(result).__module__.split('.')[0]
+    if module == 'xarray':
+        return 'zarr' if find_spec('zarr') is not None else 'netcdf'
+    if module in ('pandas', 'geopandas') and hasattr(result, 'columns'):
+        if find_spec('pyarrow') is None:
+            return 'pickle'
+        # Parquet needs string column names and plain object cells.
+        if not all(isinstance(name, str) for name in result.columns):
+            return 'pickle'
+        for name in result.columns[result.dtypes == object]:
+            sample = result[name].dropna().head(10)
+            if not all(isinstance(value, (str, bytes)) for value in sample):
+                return 'pickle'
+        return 'parquet'
+    return 'pickle'
+
+def _xarray_dataset(result, backend='zarr', codec=None, level=None):
+    """
+    Wrap a DataArray as a Dataset ready to write (internal).
+
+    The DataArray name is saved in the `landmapy_dataarray` attribute
+    (and `landmapy_unnamed` for a DataArray with no name)
+    so that `_read_cached` can unwrap it again.
+    Attributes in `CF_ATTRS`, such as a rioxarray `_FillValue`,
+    are renamed with a `landmapy` prefix, so integer rasters are not
+    masked to float on read; `_read_cached` restores them.
+    Encodings from the source files are dropped
+    and spatial variables are chunked in blocks of up to 512 x 512.
+    With a codec, Zarr chunks are compressed with Blosc using that codec;
+    NetCDF supports only zlib, which is used for either codec.
+
+    Args:
+      result (da or ds): DataArray or Dataset
+      backend (str): 'zarr' or 'netcdf'
+      codec (str, optional): 'zstd', 'lz4' or `None` for no compression
+      level (int, optional): compression level
+    Returns:
+      ds (ds): Dataset
+    """
+    compression = {}
+    if codec is not None and backend == 'zarr':
+        import zarr
+        clevel = 5 if level is None else level
+        if int(zarr.__version__.split('.')[0]) >= 3:
+            from zarr.codecs import BloscCodec
+            compression['compressors'] = [
+                BloscCodec(cname=codec, clevel=clevel, shuffle='shuffle')]
+        else:
+            from numcodecs import Blosc
+            compression['compressor'] = Blosc(
+                cname=codec, clevel=clevel, shuffle=Blosc.SHUFFLE)
+    elif codec is not None:
+        compression.update(zlib=True, complevel=4 if level is None else level)
+
+    if hasattr(result, 'data_vars'):
+        ds = result.copy(deep=False)
+    else:
+        name = result.name if isinstance(result.name, str) else '__xarray_dataarray__'
+        ds = result.to_dataset(name=name).copy(deep=False)
+        ds.attrs['landmapy_dataarray'] = name
+        if result.name is None:
+            ds.attrs['landmapy_unnamed'] = 1
+
+    for variable in ds.variables.values():
+        variable.encoding = {}
+        variable.attrs = {
+            f'landmapy{key}' if key in CF_ATTRS else key: value
+            for key, value in variable.attrs.items()}
+    for name in list(ds.data_vars):
+        variable = ds.variables[name]
+        if not variable.ndim:
+            continue
+        # One block per leading index (band, datetime); tiles on the last two.
+        chunks = tuple(
+            min(size, 512) if i >= variable.ndim - 2 else 1
+            for i, size in enumerate(variable.shape))
+        if variable.chunks is not None:
+            ds[name] = ds[name].chunk(dict(zip(variable.dims, chunks)))
+        elif backend == 'zarr':
+            variable.encoding['chunks'] = chunks
+        else:
+            variable.encoding['chunksizes'] = chunks
+        ds.variables[name].encoding.update(compression)
+    return ds
+
+def _find_cached(base):
+    """
+    Find the stored file for a cache key (internal).
+
+    Args:
+      base (str): path in the `jars` directory without suffix
+    Returns:
+      path (str): existing path, or `None` if not cached
+    """
+    import os
+
+    for suffix in STORAGE_SUFFIXES.values():
+        if os.path.exists(base + suffix):
+            return base + suffix
+    return None
+
+def _remove_cached(path):
+    """
+    Remove a stored file or Zarr directory if present (internal).
+
+    Args:
+      path (str): path to remove
+    """
+    import os
+    import shutil
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def _file_lock(path, remove=False):
+    """
+    Exclusive cross-process lock on `{path}.lock` in a `.locks` subdirectory (internal).
+
+    Uses `fcntl.flock`, which also excludes other threads
+    as each call opens its own file description.
+    With `remove=True`, the lock file is deleted before it is released;
+    processes that were waiting on the deleted file notice and lock the new one.
+
+    Args:
+      path (str): path to protect
+      remove (bool, optional): When True, delete the lock file afterwards
+    Returns:
+      lock (context manager): holds the lock inside a `with` block
+    """
+    import os
+    from contextlib import contextmanager
+
+    directory, name = os.path.split(path)
+    lock_path = os.path.join(directory, '.locks', f'{name}.lock')
+
+    @contextmanager
+    def hold_lock():
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        while True:
+            file = open(lock_path, 'a')
+            fcntl.flock(file, fcntl.LOCK_EX)
+            # Retry if the file was removed while waiting
+            try:
+                if os.stat(lock_path).st_ino == os.fstat(file.fileno()).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            file.close()
+        try:
+            yield
+        finally:
+            if remove:
+                os.remove(lock_path)
+            fcntl.flock(file, fcntl.LOCK_UN)
+            file.close()
+
+    return hold_lock()
+
+def _write_cached(result, base, storage='auto', codec=None, level=None):
+    """
+    Write result with the chosen storage backend (internal).
+
+    The result is written to a hidden temporary name in the `jars` directory,
+    then earlier files for the key are removed
+    and the temporary is renamed into place,
+    so readers never see a partly written file.
+    With `storage='auto'`, a backend that fails to write
+    (for instance attributes NetCDF cannot hold) falls back to pickle.
+    The codec compresses pickles as a whole stream
+    ('.pickle.zst' or '.pickle.lz4'), Parquet column chunks and Zarr chunks.
+
+    Args:
+      result (object): result of the compute function
+      base (str): path in the `jars` directory without suffix
+      storage (str): 'auto', 'zarr', 'netcdf', 'parquet' or 'pickle'
+      codec (str, optional): 'zstd', 'lz4' or `None` for no compression
+      level (int, optional): compression level; `None` uses the codec default
+    Returns:
+      path (str): path written
+      raw_bytes (int): uncompressed size (pickle stream, or in-memory estimate)
+    """
+    import os
+    import pickle
+    import uuid
+
+    if storage not in STORAGE_SUFFIXES and storage != 'auto':
+        raise ValueError(f'Unknown storage {storage!r}')
+    if codec not in (None, *CODECS):
+        raise ValueError(f'Unknown codec {codec!r}')
+    backend = _auto_storage(result) if storage == 'auto' else storage
+    if backend.startswith('pickle'):
+        backend = 'pickle' if codec is None else f'pickle-{codec}'
+    suffix = STORAGE_SUFFIXES[backend]
+    directory, key = os.path.split(base)
+    temp_path = os.path.join(directory, f'.{key}.{uuid.uuid4().hex}{suffix}')
+    raw_bytes = None
+    try:
+        if backend in ('zarr', 'netcdf'):
+            ds = _xarray_dataset(result, backend, codec, level)
+            if backend == 'zarr':
+                ds.to_zarr(temp_path, mode='w')
+            else:
+                ds.to_netcdf(temp_path)
+        elif backend == 'parquet':
+            options = {} if level is None else dict(compression_level=level)
+            result.to_parquet(temp_path, compression=codec or 'snappy', **options)
+        else:
+            with _open_payload(temp_path, 'wb', codec, level) as file:
+                writer = _CountingWriter(file)
+                pickle.dump(result, writer)
+                raw_bytes = writer.nbytes
+            with open(temp_path, 'rb+') as file:
+                os.fsync(file.fileno())
+    except Exception:
+        _remove_cached(temp_path)
+        if storage != 'auto' or backend.startswith('pickle'):
+            raise
+        return _write_cached(result, base, 'pickle', codec, level)
+
+    # Swap in the new file
+    for old_suffix in STORAGE_SUFFIXES.values():
+        _remove_cached(base + old_suffix)
+    os.replace(temp_path, base + suffix)
+    if raw_bytes is None:
+        raw_bytes = _sizeof(result)
+    return base + suffix, raw_bytes
+
+class _CountingWriter:
+    """
+    File wrapper counting bytes written, to size compressed pickles (internal).
+    """
+    def __init__(self, file):
+        self.file = file
+        self.nbytes = 0
+
+    def write(self, data):
+        self.nbytes += len(data)
+        return self.file.write(data)
+
+def _open_payload(path, mode, codec=None, level=None):
+    """
+    Open a pickle payload, compressed with a codec or plain (internal).
+
+    Args:
+      path (str): file path
+      mode (str): 'rb' or 'wb'
+      codec (str, optional): 'zstd', 'lz4' or `None`
+      level (int, optional): compression level when writing
+    Returns:
+      file (file-like): binary file object
+    """
+    if codec == 'zstd':
+        import zstandard
+        if mode == 'wb':
+            compressor = zstandard.ZstdCompressor(
+                level=3 if level is None else level, threads=-1)
+            return zstandard.open(path, mode, cctx=compressor)
+        return zstandard.open(path, mode)
+    if codec == 'lz4':
+        import lz4.frame
+        options = {} if level is None or mode != 'wb' else dict(compression_level=level)
+        return lz4.frame.open(path, mode, **options)
+    return open(path, mode)
+
+def _read_cached(path, lazy=False):
+    """
+    Read result with the storage backend matching the path suffix (internal).
+
+    With `lazy=True`, Zarr and NetCDF files are opened without reading data:
+    variables are dask arrays on the stored chunks when `dask` is installed,
+    or lazily indexed arrays that read only the selected blocks otherwise.
+
+    Args:
+      path (str): path from `_find_cached`
+      lazy (bool): When True, do not load xarray data into memory
+    Returns:
+      result (object): cached result
+    """
+    import pickle
+
+    if path.endswith(STORAGE_SUFFIXES['zarr']) or path.endswith(STORAGE_SUFFIXES['netcdf']):
+        from importlib.util import find_spec
+        import numpy as np
+        import xarray as xr
+        chunks = {} if lazy and find_spec('dask') is not None else None
+        if path.endswith(STORAGE_SUFFIXES['zarr']):
+            ds = xr.open_zarr(path, chunks=chunks)
+        else:
+            ds = xr.open_dataset(path, chunks=chunks)
+        if not lazy:
+            ds = ds.load()
+            ds.close()
+        for variable in ds.variables.values():
+            for key in CF_ATTRS:
+                if f'landmapy{key}' in variable.attrs:
+                    value = variable.attrs.pop(f'landmapy{key}')
+                    # The fill value xarray adds to floats would hide the original
+                    variable.encoding.pop(key, None)
+                    variable.attrs[key] = (
+                        np.array(value, dtype=variable.dtype)[()]
+                        if key in ('_FillValue', 'missing_value') else value)
+        name = ds.attrs.pop('landmapy_dataarray', None)
+        if ds.attrs.pop('landmapy_unnamed', 0):
+            return ds[name].rename(None)
+        return ds if name is None else ds[name]
+    if path.endswith(STORAGE_SUFFIXES['parquet']):
+        import geopandas as gpd
+        import pandas as pd
+        try:
+            return gpd.read_parquet(path)
+        except ValueError:
+            # Plain DataFrame without GeoParquet metadata
+            return pd.read_parquet(path)
+    codec = next((codec for codec in CODECS
+                  if path.endswith(STORAGE_SUFFIXES[f'pickle-{codec}'])), None)
+    with _open_payload(path, 'rb', codec) as file:
+        return pickle.load(file)
+
+def cached(func_key, override=False, hash_args=None, storage=None, lazy=None,
+           memory=None, versioned=None, depends=(), codec=None):
     """
     A decorator to cache function results.
     
-    The decorator loads a cached pickle file
-    in the `jars` directory under the `HOME` directory
+    The decorator loads a cached file
+    in the `jars` directory under the `HOME` directory (see `jars_dir()`)
     if it already exists
     and the `override` argument is set to `False`,
     or computes the decorated function and caches the results.
-    The decorator names the pickle file as 'f{func_key}.pickle'.
+    The decorator names the file as 'f{func_key}.{suffix}',
+    where the suffix depends on the storage backend:
+    xarray objects go to chunked Zarr ('.zarr', or NetCDF '.nc' without `zarr`),
+    (Geo)DataFrames to (Geo)Parquet ('.parquet')
+    and anything else to pickle ('.pickle').
     If a key word `cache_key` is an argument in the decorated function,
-    it is used to alter the file name to 'f{func_key}_{cache_key}.pickle'.
+    it is used to alter the file name to 'f{func_key}_{cache_key}.{suffix}'.
     This `cache_key` keyword is detected by the decorator via `**kwargs`.
+    With `memory=True` (or `configure_cache(memory=True)`), results are also
+    held in an in-process LRU memory tier, bounded by
+    `CACHE_CONFIG['memory_bytes']`, which is consulted before the `jars` directory.
+    The same object is returned on each memory hit, so treat it as read-only,
+    and use `clear_memory()` after changing files by hand.
+    The tier is off by default, so each call returns a fresh copy
+    that callers may change freely.
+    Writes are recorded in a manifest (see `cache_entries()`),
+    disk hits in a log that is folded into it on the next write,
+    and entries are evicted by `prune_cache()` after each write
+    when `CACHE_CONFIG['quota_bytes']` or `CACHE_CONFIG['ttl_seconds']` is set.
+    Writes are atomic, and a file lock per key lets one process compute
+    while others started on the same key wait and then load its result.
+    Stored results may be compressed with zstd or lz4 (see `codec`);
+    the manifest records compression ratio and write and load times.
+    Per-`func_key` counters are available from `cache_stats()`.
+    If `hash_args` is True, a hash of the arguments (see `cache_hash`)
+    is appended as well, so that calls with different inputs
+    do not share one file.
+    If `versioned` is True, a fingerprint of the decorated function's source,
+    the landmapy version and `depends` (see `code_fingerprint`)
+    is appended too, so that changed code recomputes
+    rather than loading results of the old code.
     Args:
       func_key (str): File basename used to save pickled results
       override (bool): When True, re-compute even if the results are already stored
+      hash_args (bool, optional): When True, add a hash of the arguments to the file name;
+        `None` uses `CACHE_CONFIG['hash_args']`
+      storage (str, optional): 'auto', 'zarr', 'netcdf', 'parquet' or 'pickle';
+        `None` uses `CACHE_CONFIG['storage']`
+      lazy (bool, optional): When True, reopen cached Zarr or NetCDF results
+        without loading them into memory; `None` uses `CACHE_CONFIG['lazy']`
+      memory (bool, optional): When True, use the in-process memory tier
+        (results are shared, not copied); `None` uses `CACHE_CONFIG['memory']`
+      versioned (bool, optional): When True, add a code fingerprint to the file name;
+        `None` uses `CACHE_CONFIG['versioned']`
+      depends (list, optional): Functions, modules or values the results also depend on
+      codec (str, optional): 'zstd' or 'lz4' to compress stored results,
+        'none' for no compression; `None` uses `CACHE_CONFIG['codec']`
     """
     def compute_and_cache_decorator(compute_function):
         """
@@ -24,6 +1148,9 @@ def cached(func_key, override=False):
         Returns:
           compute_and_cache_decorator( decorator): decorator
         """
+        # Fingerprint of the code, computed on first use
+        fingerprint = []
+
         def compute_and_cache(*args, **kwargs):
             """
             Perform a computation and cache, or load cached result.
@@ -33,8 +1160,7 @@ def cached(func_key, override=False):
               kwargs (list): Keyword arguments for the compute function
             """
             import os
-            import pickle
-            import earthpy as et
+            import time
 
             # Add an identifier from the particular function call
             if 'cache_key' in kwargs:
@@ -42,24 +1168,84 @@ def cached(func_key, override=False):
             else:
                 key = func_key
 
-            path = os.path.join(
-                et.io.HOME, et.io.DATA_NAME, 'jars', f'{key}.pickle')
+            # Add a content hash of the arguments
+            use_hash = CACHE_CONFIG['hash_args'] if hash_args is None else hash_args
+            if use_hash:
+                key = '_'.join((key, cache_hash(*args, **kwargs)[:16]))
+
+            # Add a fingerprint of the code
+            use_version = CACHE_CONFIG['versioned'] if versioned is None else versioned
+            if use_version:
+                if not fingerprint:
+                    fingerprint.append(code_fingerprint(compute_function, depends))
+                key = '_'.join((key, 'v' + fingerprint[0][:8]))
+
+            # Check the memory tier first
+            use_memory = CACHE_CONFIG['memory'] if memory is None else memory
+            if use_memory and not override:
+                found, result = _memory_get(key)
+                if found:
+                    _record_event(func_key, key, 'memory_hit')
+                    return result
+
+            base = os.path.join(jars_dir(), key)
+            path = _find_cached(base)
             
             # Check if the cache exists already or override caching
-            if not os.path.exists(path) or override:
+            computed = False
+            if path is None or override:
                 # Make jars directory if needed
-                os.makedirs(os.path.dirname(path), exist_ok=True)
-                
-                # Run the compute function as the user did
-                result = compute_function(*args, **kwargs)
-                
-                # Pickle the object
-                with open(path, 'wb') as file:
-                    pickle.dump(result, file)
+                os.makedirs(os.path.dirname(base), exist_ok=True)
+
+                # Only one process computes; others wait here, then load
+                with _file_lock(base):
+                    if not override:
+                        path = _find_cached(base)
+                    if path is None or override:
+                        # Run the compute function as the user did
+                        start = time.perf_counter()
+                        result = compute_function(*args, **kwargs)
+                        compute_seconds = time.perf_counter() - start
+
+                        # Store the object
+                        use_storage = CACHE_CONFIG['storage'] if storage is None else storage
+                        use_codec = CACHE_CONFIG['codec'] if codec is None else codec
+                        start = time.perf_counter()
+                        path, raw_bytes = _write_cached(
+                            result, base, use_storage,
+                            None if use_codec == 'none' else use_codec,
+                            CACHE_CONFIG['codec_level'])
+                        write_seconds = time.perf_counter() - start
+                        entry = _manifest_record(key, path, func_key,
+                                                 seconds=write_seconds,
+                                                 raw_bytes=raw_bytes)
+                        _record_event(
+                            func_key, key, 'override' if override else 'miss',
+                            compute_seconds=compute_seconds,
+                            write_seconds=write_seconds,
+                            bytes_written=entry['bytes'])
+                        computed = True
+
+                # Evict older entries if a quota or age limit is set
+                if computed and (CACHE_CONFIG['quota_bytes'] is not None
+                                 or CACHE_CONFIG['ttl_seconds'] is not None):
+                    prune_cache(keep=[key])
+            if not computed:
+                # Load the object
+                use_lazy = CACHE_CONFIG['lazy'] if lazy is None else lazy
+                start = time.perf_counter()
+                result = _read_cached(path, use_lazy)
+                load_seconds = time.perf_counter() - start
+                entry = _manifest_record(key, path, func_key, hit=True,
+                                         seconds=load_seconds)
+                _record_event(func_key, key, 'hit', load_seconds=load_seconds,
+                              bytes_read=entry['bytes'])
+
+            if use_memory:
+                _memory_put(key, result, path)
             else:
-                # Unpickle the object
-                with open(path, 'rb') as file:
-                    result = pickle.load(file)
+                with _MEMORY_LOCK:
+                    _MEMORY.pop(key, None)
                     
             return result
         
@@ -1,87 +1,406 @@
-def search_earthaccess(delta_gdf, dates=("2023-05", "2023-09")):
+import threading
+
+from landmapy.initial import _GDAL_REMOTE
+
+# Earthdata authentication shared by all searches and reads in this process.
+_SESSION = {'auth': None}
+_SESSION_LOCK = threading.Lock()
+
+# GDAL settings for reading Earthdata URLs: the remote-read settings of
+# `gdal_profile`, plus credentials from `.netrc` with the login cookies
+# shared by all connections and kept alive.
+GDAL_EARTHDATA = {
+    **_GDAL_REMOTE,
+    "GDAL_HTTP_NETRC": "YES",
+    "GDAL_HTTP_COOKIEFILE": "~/cookies.txt",
+    "GDAL_HTTP_COOKIEJAR": "~/cookies.txt",
+    "GDAL_HTTP_TCP_KEEPALIVE": "YES",
+}
+
+# Columns of the granule index from `update_granule_index`.
+INDEX_COLUMNS = ['granule_id', 'tile_id', 'datetime', 'cloud_cover', 'urls', 'geometry']
+
+def earthaccess_login(persist=True):
+    """
+    Log in to earthaccess once per process.
+
+    Later calls return the same authentication, so the earthaccess store
+    and its pooled HTTPS sessions are kept rather than rebuilt.
+    GDAL settings from `GDAL_EARTHDATA` are added to the environment
+    (without replacing ones already set) so URL strings opened with
+    `rioxarray` reuse the Earthdata credentials and connections.
+
+    Args:
+        persist (bool, optional): When True, save credentials to `.netrc`
+    Returns:
+        auth (Auth): earthaccess authentication
+    """
+    import os
+    import earthaccess
+
+    with _SESSION_LOCK:
+        if _SESSION['auth'] is None or not _SESSION['auth'].authenticated:
+            _SESSION['auth'] = earthaccess.login(persist=persist)
+            for name, value in GDAL_EARTHDATA.items():
+                os.environ.setdefault(name, os.path.expanduser(value))
+        return _SESSION['auth']
+
+# auth = earthaccess_login()
+
+def search_earthaccess(delta_gdf, dates=("2023-05", "2023-09"),
+                       max_cloud_cover=None, min_overlap=None):
     """
     Search EarthAccess for granules overlapping with gdf.
 
+    Granules are prefiltered from their UMM metadata, before any raster is read:
+    `max_cloud_cover` is passed to the CMR search and checked again
+    against each granule, and `min_overlap` drops granules whose footprint
+    covers less than that fraction of the AOI (areas in its UTM zone).
+
     Args:
-        delta_gdf (gdf): GeoDataFrame.
+        delta_gdf (gdf): GeoDataFrame in any CRS; searched by its lon/lat bounds
         dates (tuple, optional): Inclusive dates. Defaults to ("2023-05", "2023-09").
+        max_cloud_cover (float, optional): largest granule cloud cover in percent
+        min_overlap (float, optional): smallest fraction (0-1) of the AOI covered by a granule
     Returns:
         results (list): list of metadata for granules
     """
     import earthaccess
+    import geopandas as gpd
 
-    # Log in to earthaccess
-    earthaccess.login(persist=True)
+    # Log in to earthaccess, once per process
+    earthaccess_login()
     # Search for HLS tiles
+    search_options = {}
+    if max_cloud_cover is not None:
+        search_options['cloud_cover'] = (0, max_cloud_cover)
     results = earthaccess.search_data(
         short_name="HLSL30",
         cloud_hosted=True,
-        bounding_box=tuple(delta_gdf.total_bounds),
-        temporal=dates # was ("2024-06", "2024-08")
+        bounding_box=tuple(delta_gdf.to_crs(4326).total_bounds),
+        temporal=dates, # was ("2024-06", "2024-08")
+        **search_options
     )
+
+    if results and (max_cloud_cover is not None or min_overlap is not None):
+        info_gdf = gpd.GeoDataFrame(
+            [_granule_info(granule) for granule in results], crs="EPSG:4326")
+        keep = _granule_keep(info_gdf, delta_gdf, max_cloud_cover, min_overlap)
+        results = [granule for granule, kept in zip(results, keep) if kept]
     return results
 
-# results = search_earthaccess(delta_gdf, ("2023-05", "2023-09"))
+# results = search_earthaccess(delta_gdf, ("2023-05", "2023-09"), max_cloud_cover=50, min_overlap=0.1)
 
-def get_earthaccess_links(results):
+def get_earthaccess_links(results, open_files=True):
     """
     Get EarthAccess Links.
 
+    All granules are opened in one batched `earthaccess.open` call,
+    and the link table is built once from columns.
+    With `open_files=False`, the `url` column holds HTTPS URL strings
+    from the granule metadata instead, deferring any connection
+    until a file is read.
+
     Args:
-        results (list): 
+        results (list): granules from `search_earthaccess`
+        open_files (bool, optional): When True, open the files; when False, keep URLs only
+    Returns:
+        file_df (gdf): datetime, tile_id, band, url and footprint geometry per file
+    """
+    import earthaccess
+
+    # Granule information by granule ID
+    granule_info = {}
+    for granule in results:
+        info = _granule_info(granule)
+        granule_info[info['granule_id']] = info
+
+    # Get all files or URLs at once
+    earthaccess_login()
+    if open_files:
+        files = earthaccess.open(list(results))
+        names = [file.full_name for file in files]
+    else:
+        files = [link for granule in results for link in granule.data_links()]
+        names = files
+
+    return _link_table(names, files, granule_info)
+
+# file_df = get_earthaccess_links(results)
 
+def update_granule_index(aoi_gdf, dates=("2023-05", "2023-09"), index_path=None):
+    """
+    Add granules for an AOI and dates to the local granule index.
+
+    The index is a GeoParquet file with one row per granule, keyed by
+    `granule_id`, holding tile_id, datetime, cloud_cover, footprint geometry
+    and the band URLs (as a JSON list).
+    A sidecar `{index_path}.coverage.json` records each bounding box and
+    date range already searched, so only the days not yet covered for the
+    AOI are searched with `search_earthaccess`; when all are covered,
+    there is no network access.
+
+    Args:
+        aoi_gdf (gdf): area of interest
+        dates (tuple, optional): Inclusive dates. Defaults to ("2023-05", "2023-09").
+        index_path (str, optional): index file (default `hls_granules.parquet` in the `earthaccess` data directory)
     Returns:
-        _type_: _description_
+        index_gdf (gdf): granules of the index overlapping the AOI and dates
     """
-    import re
+    import json
+    import os
+    import geopandas as gpd
     import pandas as pd
+
+    index_path = _index_path(index_path)
+    coverage_path = f'{index_path}.coverage.json'
+    coverage = []
+    if os.path.exists(coverage_path):
+        with open(coverage_path) as file:
+            coverage = json.load(file)
+
+    bbox = [float(bound) for bound in aoi_gdf.to_crs(4326).total_bounds]
+    start, end = (pd.Timestamp(date) for date in dates)
+    gaps = _coverage_gaps(coverage, bbox, start, end)
+
+    if gaps:
+        rows = []
+        for gap_start, gap_end in gaps:
+            gap_dates = (gap_start.strftime('%Y-%m-%d'), gap_end.strftime('%Y-%m-%d'))
+            for granule in search_earthaccess(aoi_gdf, gap_dates):
+                info = _granule_info(granule)
+                info['urls'] = json.dumps(granule.data_links())
+                rows.append(info)
+        new_gdf = gpd.GeoDataFrame(
+            pd.DataFrame(rows, columns=INDEX_COLUMNS), crs="EPSG:4326")
+        if os.path.exists(index_path):
+            new_gdf = pd.concat([gpd.read_parquet(index_path), new_gdf])
+        new_gdf = (
+            new_gdf
+            .drop_duplicates('granule_id', keep='last')
+            .sort_values(['datetime', 'tile_id'])
+            .reset_index(drop=True))
+
+        # Write atomically, index before coverage
+        temp_path = f'{index_path}.tmp'
+        new_gdf.to_parquet(temp_path)
+        os.replace(temp_path, index_path)
+        coverage.append(dict(
+            bbox=bbox, start=start.strftime('%Y-%m-%d'), end=end.strftime('%Y-%m-%d')))
+        with open(f'{coverage_path}.tmp', 'w') as file:
+            json.dump(coverage, file, indent=1)
+        os.replace(f'{coverage_path}.tmp', coverage_path)
+
+    return query_granule_index(aoi_gdf, dates, index_path)
+
+# index_gdf = update_granule_index(delta_gdf, ("2023-05", "2023-09"))
+
+def query_granule_index(aoi_gdf=None, dates=None, index_path=None,
+                        max_cloud_cover=None, min_overlap=None):
+    """
+    Query the local granule index by AOI and dates.
+
+    Args:
+        aoi_gdf (gdf, optional): area of interest; granules whose footprint intersects it
+        dates (tuple, optional): Inclusive dates
+        index_path (str, optional): index file from `update_granule_index`
+        max_cloud_cover (float, optional): largest granule cloud cover in percent
+        min_overlap (float, optional): smallest fraction (0-1) of the AOI covered by a granule;
+            needs `aoi_gdf`
+    Returns:
+        index_gdf (gdf): matching rows of the index
+    """
+    import os
     import geopandas as gpd
-    import earthaccess
-    from tqdm.notebook import tqdm
+    import pandas as pd
+
+    if min_overlap is not None and aoi_gdf is None:
+        raise ValueError('min_overlap needs aoi_gdf')
+    index_path = _index_path(index_path)
+    if not os.path.exists(index_path):
+        return gpd.GeoDataFrame(
+            pd.DataFrame(columns=INDEX_COLUMNS), crs="EPSG:4326")
+    index_gdf = gpd.read_parquet(index_path)
+
+    if aoi_gdf is not None:
+        aoi = aoi_gdf.to_crs(index_gdf.crs).geometry
+        # Bounding box first, then exact footprints
+        index_gdf = index_gdf.cx[
+            aoi.total_bounds[0]:aoi.total_bounds[2],
+            aoi.total_bounds[1]:aoi.total_bounds[3]]
+        index_gdf = index_gdf[index_gdf.intersects(aoi.union_all())]
+    if dates is not None:
+        start, end = (pd.Timestamp(date, tz='UTC') for date in dates)
+        datetimes = pd.to_datetime(index_gdf.datetime, utc=True)
+        index_gdf = index_gdf[
+            (datetimes >= start) & (datetimes < end + pd.Timedelta(days=1))]
+    if len(index_gdf) and (max_cloud_cover is not None or min_overlap is not None):
+        index_gdf = index_gdf[
+            _granule_keep(index_gdf, aoi_gdf, max_cloud_cover, min_overlap)]
+
+    return index_gdf.reset_index(drop=True)
+
+# index_gdf = query_granule_index(delta_gdf, ("2023-06", "2023-08"), max_cloud_cover=50)
+
+def granule_links(index_gdf):
+    """
+    Link table of band URLs from granule index rows.
+
+    Same columns as `get_earthaccess_links(results, open_files=False)`,
+    with no search or metadata requests.
+
+    Args:
+        index_gdf (gdf): rows from `update_granule_index` or `query_granule_index`
+    Returns:
+        file_df (gdf): datetime, tile_id, band, url and footprint geometry per file
+    """
+    import json
+
+    granule_info = {}
+    names = []
+    for info in index_gdf.to_dict('records'):
+        granule_info[info['granule_id']] = info
+        names.extend(json.loads(info['urls']))
+
+    return _link_table(names, names, granule_info)
+
+# file_df = granule_links(index_gdf)
+
+def _granule_info(granule):
+    """
+    Granule ID, tile, start time, cloud cover and footprint from UMM metadata (internal).
+
+    Args:
+        granule (DataGranule): granule from `search_earthaccess`
+    Returns:
+        info (dict): granule_id, tile_id, datetime, cloud_cover and geometry (Polygon in lon/lat)
+    """
+    import pandas as pd
     from shapely.geometry import Polygon
-    
+
+    info_dict = granule['umm']
+    points = (
+        info_dict
+        ['SpatialExtent']['HorizontalSpatialDomain']['Geometry']['GPolygons'][0]
+        ['Boundary']['Points'])
+    # HLS records cloud cover as an additional attribute
+    attributes = {
+        attribute['Name']: attribute['Values'][0]
+        for attribute in info_dict.get('AdditionalAttributes', [])}
+    cloud_cover = info_dict.get('CloudCover', attributes.get('CLOUD_COVERAGE'))
+    return dict(
+        granule_id=info_dict['GranuleUR'],
+        tile_id=info_dict['GranuleUR'].split('.')[2],
+        datetime=pd.to_datetime(
+            info_dict
+            ['TemporalExtent']['RangeDateTime']['BeginningDateTime']),
+        cloud_cover=None if cloud_cover is None else float(cloud_cover),
+        geometry=Polygon(
+            [(point['Longitude'], point['Latitude']) for point in points]))
+
+def _granule_keep(info_gdf, aoi_gdf=None, max_cloud_cover=None, min_overlap=None):
+    """
+    Granules passing the cloud cover and AOI overlap filters (internal).
+
+    Granules with unknown cloud cover are kept.
+
+    Args:
+        info_gdf (gdf): cloud_cover and footprint geometry per granule
+        aoi_gdf (gdf, optional): area of interest, needed for `min_overlap`
+        max_cloud_cover (float, optional): largest granule cloud cover in percent
+        min_overlap (float, optional): smallest fraction (0-1) of the AOI covered by a granule
+    Returns:
+        keep (array): boolean per granule
+    """
+    import numpy as np
+
+    keep = np.ones(len(info_gdf), dtype=bool)
+    if max_cloud_cover is not None:
+        cloud_cover = info_gdf.cloud_cover.astype(float).to_numpy()
+        keep &= ~(cloud_cover > max_cloud_cover)
+    if min_overlap is not None:
+        if aoi_gdf is None:
+            raise ValueError('min_overlap needs aoi_gdf')
+        # Areas in the UTM zone of the AOI
+        utm = aoi_gdf.estimate_utm_crs()
+        aoi = aoi_gdf.to_crs(utm).union_all()
+        overlap = info_gdf.to_crs(utm).intersection(aoi).area / aoi.area
+        keep &= overlap.to_numpy() >= min_overlap
+    return keep
+
+def _link_table(names, files, granule_info):
+    """
+    Link table from file names, files and granule information (internal).
+
+    Args:
+        names (list of str): file names or URLs, starting with their granule ID
+        files (list): opened files or URLs, in the order of `names`
+        granule_info (dict): `_granule_info` results by granule ID
+    Returns:
+        file_df (gdf): datetime, tile_id, band, url and footprint geometry per file
+    """
+    import re
+    import geopandas as gpd
+
     url_re = re.compile(
         r'\.(?P<tile_id>\w+)\.\d+T\d+\.v\d\.\d\.(?P<band>[A-Za-z0-9]+)\.tif')
 
-    # Loop through each granule
-    link_rows = []
-    url_dfs = []
-    for granule in tqdm(results):
-        # Get granule information
-        info_dict = granule['umm']
-        granule_id = info_dict['GranuleUR']
-        datetime = pd.to_datetime(
-            info_dict
-            ['TemporalExtent']['RangeDateTime']['BeginningDateTime'])
-        points = (
-            info_dict
-            ['SpatialExtent']['HorizontalSpatialDomain']['Geometry']['GPolygons'][0]
-            ['Boundary']['Points'])
-        geometry = Polygon(
-            [(point['Longitude'], point['Latitude']) for point in points])
-        
-        # Get URL
-        files = earthaccess.open([granule])
-
-        # Build metadata DataFrame
-        for file in files:
-            match = url_re.search(file.full_name)
-            if match is not None:
-                link_rows.append(
-                    gpd.GeoDataFrame(
-                        dict(
-                            datetime=[datetime],
-                            tile_id=[match.group('tile_id')],
-                            band=[match.group('band')],
-                            url=[file],
-                            geometry=[geometry]
-                        ),
-                        crs="EPSG:4326"
-                    )
-                )
-
-    # Concatenate metadata DataFrame
-    file_df = pd.concat(link_rows).reset_index(drop=True)
+    # Build metadata columns
+    columns = dict(datetime=[], tile_id=[], band=[], url=[], geometry=[])
+    for name, file in zip(names, files):
+        match = url_re.search(name)
+        info = granule_info.get(name.split('/')[-1].rsplit('.', 2)[0])
+        if match is not None and info is not None:
+            columns['datetime'].append(info['datetime'])
+            columns['tile_id'].append(match.group('tile_id'))
+            columns['band'].append(match.group('band'))
+            columns['url'].append(file)
+            columns['geometry'].append(info['geometry'])
+
+    file_df = gpd.GeoDataFrame(columns, crs="EPSG:4326")
     return file_df
 
-# file_df = get_earthaccess_links(results)
\ No newline at end of file
+def _index_path(index_path=None):
+    """
+    Granule index file, by default in the `earthaccess` data directory (internal).
+    """
+    import os
+    from landmapy.initial import create_data_dir
+
+    if index_path is None:
+        index_path = os.path.join(create_data_dir('earthaccess'), 'hls_granules.parquet')
+    return index_path
+
+def _coverage_gaps(coverage, bbox, start, end):
+    """
+    Date ranges from `start` to `end` not yet searched for `bbox` (internal).
+
+    Args:
+        coverage (list of dict): searched bbox, start and end dates
+        bbox (list of float): west, south, east, north in lon/lat
+        start, end (Timestamp): inclusive days
+    Returns:
+        gaps (list of tuple): inclusive (start, end) days to search
+    """
+    import pandas as pd
+
+    day = pd.Timedelta(days=1)
+    # Ranges searched for boxes containing this one
+    covered = sorted(
+        (pd.Timestamp(entry['start']), pd.Timestamp(entry['end']))
+        for entry in coverage
+        if entry['bbox'][0] <= bbox[0] and entry['bbox'][1] <= bbox[1]
+        and entry['bbox'][2] >= bbox[2] and entry['bbox'][3] >= bbox[3])
+
+    gaps = []
+    for cover_start, cover_end in covered:
+        if cover_end < start:
+            continue
+        if cover_start > end:
+            break
+        if cover_start > start:
+            gaps.append((start, cover_start - day))
+        start = max(start, cover_end + day)
+    if start <= end:
+        gaps.append((start, end))
+    return gaps
@@ -2,7 +2,10 @@
 Initialize Functions.
 
 robust_code: Make code robust to interruptions
+gdal_profile: Apply a GDAL and thread performance profile before reading rasters
 create_data_dir: Create Data Directory if it does not exist
+set_preview: Set the preview factor for reduced-resolution raster reads
+get_preview: Current preview factor
 """
 def robust_code():
     """
@@ -17,6 +20,89 @@ def robust_code():
     os.environ["GDAL_HTTP_MAX_RETRY"] = "5"
     os.environ["GDAL_HTTP_RETRY_DELAY"] = "1"
 
+# GDAL configuration shared by all profiles for remote COG reads.
+_GDAL_REMOTE = {
+    # Do not list remote directories looking for sidecar files
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    # HTTP/2 multiplexing and merging of adjacent range requests
+    "GDAL_HTTP_VERSION": "2",
+    "GDAL_HTTP_MULTIPLEX": "YES",
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+    "VSI_CACHE": "TRUE",
+}
+
+# Performance profiles: GDAL block cache (MB), GDAL threads,
+# curl and VSI caches (bytes), and threads for BLAS and OpenMP.
+GDAL_PROFILES = {
+    "laptop": dict(
+        GDAL_CACHEMAX="512",
+        GDAL_NUM_THREADS="2",
+        CPL_VSIL_CURL_CACHE_SIZE=str(64 * 2**20),
+        VSI_CACHE_SIZE=str(32 * 2**20),
+        blas_threads=2),
+    "many_core": dict(
+        GDAL_CACHEMAX="4096",
+        GDAL_NUM_THREADS="ALL_CPUS",
+        CPL_VSIL_CURL_CACHE_SIZE=str(512 * 2**20),
+        VSI_CACHE_SIZE=str(128 * 2**20),
+        blas_threads=None),
+    "container": dict(
+        GDAL_CACHEMAX="128",
+        GDAL_NUM_THREADS="1",
+        CPL_VSIL_CURL_CACHE_SIZE=str(16 * 2**20),
+        VSI_CACHE_SIZE=str(8 * 2**20),
+        blas_threads=1),
+}
+
+def gdal_profile(profile="laptop", **settings):
+    """
+    Apply a GDAL and thread performance profile before reading rasters.
+
+    Sets environment variables for the GDAL block cache, GDAL threads,
+    curl and VSI caches, remote COG access
+    (no directory listing, HTTP/2 multiplexing, merged range requests)
+    and thread limits for BLAS and OpenMP.
+    Call this before any raster is opened, and ideally before `numpy`
+    is imported, as GDAL and BLAS read some of these only once;
+    thread limits are also applied at run time if `threadpoolctl` is installed.
+    Profiles are 'laptop', 'many_core' (node of many cores)
+    and 'container' (constrained container); see `GDAL_PROFILES`.
+
+    Args:
+        profile (str, optional): name of profile in `GDAL_PROFILES`
+        settings (dict): GDAL configuration options overriding the profile,
+            or `blas_threads` (int, `None` for all cores)
+    Returns:
+        applied (dict): environment variables set
+    """
+    import os
+
+    if profile not in GDAL_PROFILES:
+        raise ValueError(
+            f"Unknown profile {profile!r}; choose from {list(GDAL_PROFILES)}")
+    options = {**_GDAL_REMOTE, **GDAL_PROFILES[profile], **settings}
+
+    # Thread limits for numerical libraries
+    blas_threads = options.pop("blas_threads")
+    if blas_threads is None:
+        blas_threads = os.cpu_count() or 1
+    for name in ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                 "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS"]:
+        options[name] = str(blas_threads)
+
+    applied = {name: str(value) for name, value in options.items()}
+    os.environ.update(applied)
+
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(blas_threads)
+    except ImportError:
+        pass
+
+    return applied
+
+# gdal_profile("container", GDAL_CACHEMAX="256")
+
 def create_data_dir(new_dir='habitat'):
     """
     Create Data Directory if it does not exist.
@@ -41,3 +127,44 @@ def create_data_dir(new_dir='habitat'):
 
 # data = create_data_dir('habitat')
 
+def set_preview(factor=None):
+    """
+    Set the preview factor for reduced-resolution raster reads.
+
+    Raster reads through `process.open_raster` (used by `process_image`,
+    `ndvi_naip_one`, `srtm_download`, `merge_soil` and `compute_reflectance_da`)
+    keep one pixel in `factor` along each axis, from COG overviews where
+    available (QA rasters such as Fmask skip overviews). Reads are only
+    reduced where an overview is used; decimation saves memory, not I/O.
+    The factor is kept in the environment variable `LANDMAPY_PREVIEW`,
+    so worker processes inherit it.
+
+    Args:
+        factor (int, optional): 8 for 1/8 resolution; None or 1 for full resolution
+    Returns:
+        previous (int): previous preview factor
+    """
+    import os
+
+    previous = get_preview()
+    if factor is None or int(factor) <= 1:
+        os.environ.pop("LANDMAPY_PREVIEW", None)
+    else:
+        os.environ["LANDMAPY_PREVIEW"] = str(int(factor))
+    return previous
+
+# set_preview(8)
+# set_preview(None)
+
+def get_preview():
+    """
+    Current preview factor.
+
+    Returns:
+        factor (int): 1 for full resolution
+    """
+    import os
+
+    return max(int(os.environ.get("LANDMAPY_PREVIEW") or 1), 1)
+
+# factor = get_preview()
@@ -118,16 +118,16 @@ def ndvi_naip_one(tract_cdc_gdf, tract, tract_date_gdf):
         _type_: _description_
     """
     import numpy as np
-    import rioxarray as rxr
     import rioxarray.merge as rxrmerge
     from scipy.ndimage import label
     from scipy.ndimage import convolve
+    from landmapy.process import open_raster
 
     # Open all images for tract
     tile_das = []
     for _, href_s in tract_date_gdf.iterrows():
         # Open vsi connection to data
-        tile_da = rxr.open_rasterio(
+        tile_da = open_raster(
             href_s.rgbir_href, masked=True).squeeze()
         
         # Clip data
@@ -184,6 +184,11 @@ def ndvi_naip_df(naip_index_path, tract_cdc_gdf, naip_scenes_df = None):
     """
     Compute NDVI index for all NAIP tracts.
 
+    With a preview factor (see `initial.set_preview`), statistics are
+    computed on decimated pixels, so they are kept in their own file,
+    `{name}_preview{factor}.csv` next to `naip_index_path`,
+    and never mixed with full-resolution results.
+
     Args:
         naip_index_path (str): address of NAIP tracts
         tract_cdc_gdf (gdf): gdf of CDC tracts
@@ -194,6 +199,13 @@ def ndvi_naip_df(naip_index_path, tract_cdc_gdf, naip_scenes_df = None):
     import os
     import pandas as pd
     from tqdm.notebook import tqdm
+    from landmapy.initial import get_preview
+
+    # Preview statistics in their own file
+    factor = get_preview()
+    if factor > 1:
+        root, ext = os.path.splitext(naip_index_path)
+        naip_index_path = f'{root}_preview{factor}{ext}'
     
     # Skip this step if no `scenes_df` data provided. 
     if not naip_scenes_df is None:
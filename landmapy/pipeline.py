@@ -0,0 +1,66 @@
+"""
+Pipeline Functions.
+
+pipeline: Read items with I/O workers while compute workers process earlier ones
+"""
+def pipeline(items, read_function, compute_function, io_workers=4,
+             compute_workers=2, max_queue=8):
+    """
+    Read items with I/O workers while compute workers process earlier ones.
+
+    Items are read in a thread pool of `io_workers` ahead of the item
+    being computed, and each read result is passed to `compute_function`
+    in a thread pool of `compute_workers` as soon as it is ready.
+    At most `max_queue` items are read or computed but not yet yielded,
+    so a slow consumer holds back the reads (backpressure)
+    and memory stays bounded.
+    Results are yielded in the order of `items`; an exception from either
+    function is raised when its item is reached.
+
+    Args:
+        items (iterable): items to process, consumed lazily
+        read_function (function): I/O step, `read_function(item)`
+        compute_function (function): compute step, `compute_function(read_result)`
+        io_workers (int, optional): number of reads at once
+        compute_workers (int, optional): number of computations at once
+        max_queue (int, optional): largest number of items in flight
+    Yields:
+        result: `compute_function(read_function(item))` for each item
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    items = iter(items)
+    done = object()
+    reads, computes = deque(), deque()
+    with ThreadPoolExecutor(max_workers=io_workers) as io_pool, \
+            ThreadPoolExecutor(max_workers=compute_workers) as compute_pool:
+        while True:
+            # Prefetch reads up to the queue bound
+            while len(reads) + len(computes) < max(max_queue, 1):
+                item = next(items, done)
+                if item is done:
+                    break
+                reads.append(io_pool.submit(read_function, item))
+            if not reads and not computes:
+                break
+
+            # Hand finished reads, in order, to compute workers
+            # until the oldest item is computed
+            while True:
+                while reads and reads[0].done():
+                    read = reads.popleft()
+                    if read.exception() is not None:
+                        # Keep the failed read in line; it raises when reached
+                        computes.append(read)
+                    else:
+                        computes.append(compute_pool.submit(
+                            compute_function, read.result()))
+                if computes and computes[0].done():
+                    break
+                wait([queue[0] for queue in (reads, computes) if queue],
+                     return_when=FIRST_COMPLETED)
+
+            yield computes.popleft().result()
+
+# results = list(pipeline(granule_dfs, read_granule, mask_granule))
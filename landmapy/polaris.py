@@ -58,9 +58,8 @@ def merge_soil(place_gdf, soil_var="sand", soil_sum="mean", soil_depth="100_200"
         soil_merged_das (da): soil estimates clipped to bounds of place_gdf 
     """
     import geopandas as gpd
-    import rioxarray as rxr
     from rioxarray.merge import merge_arrays # Merge rasters
-    from landmapy.process import clip_gdf_da_bounds
+    from landmapy.process import clip_gdf_da_bounds, open_raster
     
     soil_urls = soil_url_dict(place_gdf, soil_var, soil_sum, soil_depth)
     
@@ -69,7 +68,7 @@ def merge_soil(place_gdf, soil_var="sand", soil_sum="mean", soil_depth="100_200"
     for soil_key in list(soil_urls.keys()):
         soil_url = soil_urls[soil_key][0]
         print(soil_key)
-        soil_da = rxr.open_rasterio(soil_url, mask_and_scale=True).squeeze()
+        soil_da = open_raster(soil_url, mask_and_scale=True).squeeze()
 
         # Store the resulting DataArray for later
         soil_das.append(soil_da)
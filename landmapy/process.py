@@ -2,82 +2,190 @@
 Process functions.
 
 process_image: Load, crop, and scale a raster image from earthaccess
+open_raster: Open a raster at the preview resolution
 process_cloud_mask: Load an 8-bit Fmask file and create a boolean mask
 process_metadata: Create df of raster data URIs from earthaccess metadata
 process_bands: Process bands from gdf with df metadata
 clip_gdf_da_bounds: Clip bounds from place_gdf on da extended by buffer (internal)
-da2gdf: Convert a DataArray to a GeoDataFrame using rioxarray and geopandas
+da2gdf: Convert a DataArray to a GeoDataFrame, optionally block by block to GeoParquet
 da_combine: Create 3-D DA combining two 2-D DAs, with optional contrast
 """
-def process_image(uri, bounds_gdf):
+def process_image(uri, bounds_gdf, resolution=None, overviews=True):
     """
     Load, crop, and scale a raster image from earthaccess.
 
+    Only the pixel window covering the bounds (reprojected to the raster CRS)
+    is read. With `resolution`, the coarsest COG overview whose cells
+    are no larger than `resolution` is read instead of full resolution;
+    otherwise the preview factor of `open_raster` applies.
+    With `overviews=False` (for QA bands), the coarser resolution is
+    reached by keeping every n-th full-resolution pixel instead.
+    Like `rio.clip_box`, raises `NoDataInBounds` if the bounds miss the raster.
+
     Args:
         uri (file-like or path-like): File accessor downloaded or obtained from earthaccess
         bounds_gdf (gdf): Area of interest to crop to
+        resolution (float, optional): Target cell size in raster CRS units (meters for HLS)
+        overviews (bool, optional): When False, never read COG overviews
     Returns:
         cropped_da (da): Processed raster
     """
+    import math
     import rioxarray as rxr # Work with raster data
-
-    # Connect to the raster image
-    da = rxr.open_rasterio(uri, mask_and_scale=True).squeeze()
+    from rioxarray.exceptions import NoDataInBounds
+
+    # Connect to the raster image, at the overview level for the resolution
+    if resolution is not None and overviews:
+        da = rxr.open_rasterio(
+            uri, mask_and_scale=True,
+            overview_level=_overview_level(uri, resolution)).squeeze()
+    elif resolution is not None:
+        native, _ = _overviews(uri)
+        da = open_raster(uri, preview=max(int(resolution // native), 1),
+                         overviews=False, mask_and_scale=True).squeeze()
+    else:
+        da = open_raster(uri, overviews=overviews, mask_and_scale=True).squeeze()
 
     # Get the study bounds
-    bounds = (
+    xmin, ymin, xmax, ymax = (
         bounds_gdf
         .to_crs(da.rio.crs)
         .total_bounds
     )
     
-    # Crop
-    cropped_da = da.rio.clip_box(*bounds)
+    # Pixel window of the bounds, widened to whole pixels
+    inverse = ~da.rio.transform()
+    cols, rows = zip(*[inverse * corner for corner in
+                       [(xmin, ymin), (xmin, ymax), (xmax, ymin), (xmax, ymax)]])
+    col_start = max(math.floor(min(cols)), 0)
+    col_stop = min(math.ceil(max(cols)), da.rio.width)
+    row_start = max(math.floor(min(rows)), 0)
+    row_stop = min(math.ceil(max(rows)), da.rio.height)
+    if col_stop <= col_start or row_stop <= row_start:
+        raise NoDataInBounds(f'No data found in bounds of {uri}')
+
+    # Crop; only the window is read from the file
+    cropped_da = da.isel(
+        {da.rio.x_dim: slice(col_start, col_stop),
+         da.rio.y_dim: slice(row_start, row_stop)})
 
     return cropped_da
 
 # process_image(city_files[8], city_gdf).plot()
+# process_image(city_files[8], city_gdf, resolution=120).plot()
+
+def open_raster(uri, preview=None, overviews=True, **options):
+    """
+    Open a raster at the preview resolution.
+
+    With a preview factor above 1 (see `initial.set_preview`), the coarsest
+    COG overview no coarser than the factor is opened, and the rest of
+    the factor is made up by keeping every n-th pixel along each axis.
+    Only the overview saves I/O: decimation strides pixels after they are
+    read, so the whole window is still read at the opened level,
+    though only about one pixel in `preview**2` is kept in memory.
+    Without overviews (Fmask with `overviews=False`, or rasters such as
+    SRTM `.hgt` files that have none), previewing saves memory and compute
+    downstream but not reads.
+    COG overviews may have been built by averaging, which corrupts
+    bit-packed QA values such as Fmask; with `overviews=False` only
+    full-resolution pixels are kept (decimation only), so QA bits are intact.
+
+    Args:
+        uri (file-like or path-like): raster file or URL
+        preview (int, optional): preview factor (default `initial.get_preview()`)
+        overviews (bool, optional): When False, decimate the full-resolution raster
+        options (dict): further arguments of `rioxarray.open_rasterio`
+    Returns:
+        da (da): raster, decimated when previewing
+    """
+    import rioxarray as rxr # Work with raster data
+    from landmapy.initial import get_preview
+
+    if preview is None:
+        preview = get_preview()
+    if preview <= 1:
+        return rxr.open_rasterio(uri, **options)
+
+    # Overview no coarser than the preview factor
+    step = preview
+    _, factors = _overviews(uri) if overviews else (None, [])
+    for level, factor in enumerate(factors):
+        if factor <= preview:
+            options['overview_level'] = level
+            step = max(preview // factor, 1)
+    da = rxr.open_rasterio(uri, **options)
+
+    # Decimate the rest; strided after reading the window
+    if step > 1:
+        da = da.isel({da.rio.x_dim: slice(None, None, step),
+                      da.rio.y_dim: slice(None, None, step)})
+        da = da.rio.write_transform(da.rio.transform(recalc=True))
+    return da
+
+# set_preview(8)
+# da = open_raster(url, masked=True).squeeze()
+# fmask_da = open_raster(fmask_url, overviews=False).squeeze()
+
+def _overviews(uri):
+    """
+    Native cell size and overview factors of a raster (internal).
+
+    Args:
+        uri (file-like or path-like): raster file
+    Returns:
+        native (float): cell size in raster CRS units
+        factors (list of int): decimation factor of each overview level
+    """
+    import rasterio
+
+    with rasterio.open(uri) as src:
+        native = abs(src.res[0])
+        factors = src.overviews(1)
+    if hasattr(uri, 'seek'):
+        uri.seek(0)
+    return native, factors
+
+def _overview_level(uri, resolution):
+    """
+    Coarsest overview level with cells no larger than `resolution` (internal).
+
+    Args:
+        uri (file-like or path-like): raster file
+        resolution (float): Target cell size in raster CRS units
+    Returns:
+        overview_level (int or None): index into the overviews, None for full resolution
+    """
+    native, factors = _overviews(uri)
+
+    overview_level = None
+    for level, factor in enumerate(factors):
+        if native * factor <= resolution:
+            overview_level = level
+    return overview_level
 
 def process_cloud_mask(cloud_uri, bounds_gdf, bits_to_mask):
     """
     Load an 8-bit Fmask file and create a boolean mask.
 
+    The Fmask is read without COG overviews, so its bits are never averaged.
+    When previewing, its grid may differ from bands read from overviews;
+    match it to a band with `cloud_mask.reindex_like(band_da, method='nearest')`.
+
     Args:
         uri (file-like or path-like): Fmask file accessor downloaded or obtained from earthaccess
         bounds_gdf (gdf): Area of interest to crop to
         bits_to_mask (list of int): The indices of the bits to mask if set
     Returns:
-        cloud_mask (array of int): Cloud mask array of bits
+        cloud_mask (da of bool): Cloud mask, True where none of `bits_to_mask` are set
     """
-    import numpy as np # Process bit-wise cloud mask
+    from landmapy.qa import qa_mask # Decode bit-wise cloud mask
 
     # Open fmask file
-    fmask_da = process_image(cloud_uri, bounds_gdf)
-
-    # Unpack the cloud mask bits
-    cloud_bits = (
-        np.unpackbits(
-            (
-                # Get the cloud mask as an array...
-                fmask_da.values
-                # ... of 8-bit integers
-                .astype('uint8')
-                # With an extra axis to unpack the bits into
-                [:, :, np.newaxis]
-            ), 
-            # List the least significant bit first to match the user guide
-            bitorder='little',
-            # Expand the array in a new dimension
-            axis=-1)
-    )
+    fmask_da = process_image(cloud_uri, bounds_gdf, overviews=False)
 
-    cloud_mask = np.sum(
-        # Select bits
-        cloud_bits[:,:,bits_to_mask], 
-        # Sum along the bit axis
-        axis=-1
-    # Check if any of bits are true
-    ) == 0
+    # Check that none of the bits to mask are set
+    cloud_mask = qa_mask(fmask_da, bits_to_mask)
     
     return cloud_mask
 
@@ -86,7 +194,7 @@ def process_cloud_mask(cloud_uri, bounds_gdf, bits_to_mask):
 #     city_files[-1],
 #     city_redlining_gdf,
 #     [1, 2, 3, 5])
-# blue_da.where(city_cloud_mask).plot()
+# blue_da.where(city_cloud_mask.reindex_like(blue_da, method='nearest')).plot()
 
 def process_metadata(city_files):
     """
@@ -122,19 +230,22 @@ def process_metadata(city_files):
 # raster_df = process_metadata(city_files)
 # raster_df.head()
 
-def process_bands(city_gdf, raster_df):
+def process_bands(city_gdf, raster_df, max_workers=1):
     """
     Process bands from gdf with df metadata.
 
+    Cloud masks and bands of all tiles are read in a thread pool of
+    `max_workers`, so with several workers the network reads overlap;
+    masking and merging are the same as with one.
+
     Args:
         city_gdf (gdf): GeoDataFrame for a city
         raster_df (df): DataFrame of city metadata
+        max_workers (int, optional): number of files read at once
     Returns:
         city_das (da): DataArray with image data
     """
-    import re # Use regular expressions to extract metadata
-    import pandas as pd # Group and aggregate
-    import rioxarray as rxr # Work with raster data
+    from concurrent.futures import ThreadPoolExecutor
     from rioxarray.merge import merge_arrays # Merge rasters
 
     # Labels for each band to process
@@ -144,29 +255,39 @@ def process_bands(city_gdf, raster_df):
         'B04': 'blue',
         'B05': 'nir'
     }
+
+    def read_band(file):
+        """Load the cropped band into memory."""
+        return process_image(file, city_gdf).load()
+
     # Initialize structure for saving images
     city_das = {band_name: [] for band_name in bands.values()}
     print('Loading...')
-    for tile_id, tile_df in raster_df.groupby('tile_id'):
-        print(tile_id)
-        # Load the cloud mask
-        fmask_file = tile_df[tile_df.band_id=='Fmask'].file.values[0]
-        cloud_mask = process_cloud_mask(
-            fmask_file, 
-            city_gdf, 
-            [1, 2, 3, 5])
-
-        for band_id, row in tile_df.groupby('band_id'):
-            if band_id in bands:
-                band_name = bands[band_id]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Start reading all cloud masks and bands
+        tile_futures = []
+        for tile_id, tile_df in raster_df.groupby('tile_id'):
+            fmask_file = tile_df[tile_df.band_id=='Fmask'].file.values[0]
+            cloud_future = executor.submit(
+                process_cloud_mask, fmask_file, city_gdf, [1, 2, 3, 5])
+            band_futures = [
+                (band_id, bands[band_id],
+                 executor.submit(read_band, row.file.values[0]))
+                for band_id, row in tile_df.groupby('band_id')
+                if band_id in bands]
+            tile_futures.append((tile_id, cloud_future, band_futures))
+
+        for tile_id, cloud_future, band_futures in tile_futures:
+            print(tile_id)
+            # Load the cloud mask
+            cloud_mask = cloud_future.result()
+
+            for band_id, band_name, band_future in band_futures:
                 print(band_id, band_name)
-                # Process band
-                band_da = process_image(
-                    row.file.values[0], 
-                    city_gdf)
-
-                # Mask band
-                band_masked_da = band_da.where(cloud_mask)
+                # Mask band, on the band grid
+                band_da = band_future.result()
+                band_masked_da = band_da.where(
+                    cloud_mask.reindex_like(band_da, method='nearest'))
 
                 # Store the resulting DataArray for later
                 city_das[band_name].append(band_masked_da)
@@ -181,7 +302,7 @@ def process_bands(city_gdf, raster_df):
 
     return city_merged_das
 
-# city_merged_das = process_bands(city_redlining_gdf, raster_df)
+# city_merged_das = process_bands(city_redlining_gdf, raster_df, max_workers=8)
 # city_merged_das['green'].plot(cmap='Greens', robust=True)
 
 def clip_gdf_da_bounds(place_gdf, da, buffer = 0.1):
@@ -205,39 +326,149 @@ def clip_gdf_da_bounds(place_gdf, da, buffer = 0.1):
 
 # da = clip_gdf_da_bounds(place_gdf, da, 0.1)
 
-def da2gdf(data_array):
+def da2gdf(data_array, block_size=None, bins=None, out_path=None):
     """
     Convert a DataArray to a GeoDataFrame using rioxarray and geopandas.
+
+    With `block_size`, the raster is vectorized in strips of that many rows,
+    so only one strip of values is in memory (lazy or dask arrays are read
+    strip by strip). Polygons with the same value that share an edge across
+    a strip seam are merged, so the result has the same polygons as a
+    whole-raster pass; polygons away from the seams are finished as each
+    strip is done. With `out_path`, finished polygons are written as they
+    go to GeoParquet part files in that directory
+    (read back with `gpd.read_parquet(out_path)`) instead of being kept.
+    With `bins`, values are first binned, which bounds the number of
+    polygons for continuous rasters.
     
     Args:
         data_array (da): data array
+        block_size (int, optional): rows per strip (default all rows)
+        bins (int or list of float, optional): number of equal-width bins
+            between the minimum and maximum, or bin edges;
+            `value` is then the lower edge of each bin
+        out_path (str, optional): directory for GeoParquet part files
     Returns
-        gdf (gdf): GeoDataFrame
+        gdf (gdf): GeoDataFrame, or `out_path` when given
     """
+    import os
     import geopandas as gpd
-    from rasterio.features import shapes
     import numpy as np
+    import pandas as pd
+    from shapely.affinity import affine_transform
 
     # Ensure the DataArray has spatial information.
     data_array = data_array.rio.write_crs("EPSG:4326")
+    transform = data_array.rio.transform()
+    crs = data_array.rio.crs
+    height = data_array.rio.height
+    y_dim = data_array.rio.y_dim
+    if block_size is None:
+        block_size = height
+
+    # Bin edges for quantization
+    edges = None
+    if bins is not None:
+        if np.ndim(bins) == 0:
+            edges = np.linspace(
+                float(data_array.min()), float(data_array.max()), int(bins) + 1)
+        else:
+            edges = np.asarray(bins, dtype=float)
+
+    if out_path is not None:
+        os.makedirs(out_path, exist_ok=True)
+    gdfs = []
+
+    def finish(polygons, part):
+        """Move polygons from pixel to map coordinates and store or write them."""
+        gdf = gpd.GeoDataFrame(
+            {'geometry': [
+                affine_transform(geom, [transform.a, transform.b, transform.d,
+                                        transform.e, transform.c, transform.f])
+                for geom, _ in polygons],
+             'value': [value for _, value in polygons]},
+            crs=crs)
+        if out_path is None:
+            gdfs.append(gdf)
+        elif len(gdf):
+            gdf.to_parquet(os.path.join(out_path, f'part-{part:05d}.parquet'))
+
+    # Polygons touching the bottom seam of the last strip, in pixel coordinates
+    pending = []
+    for part, row_start in enumerate(range(0, height, block_size)):
+        row_stop = min(row_start + block_size, height)
+        block_da = data_array.isel({y_dim: slice(row_start, row_stop)})
+        polygons = _block_shapes(block_da.values, row_start, edges)
+
+        # Merge polygons across the top seam with those left from the last strip
+        if pending:
+            top = [polygon for polygon in polygons if polygon[0].bounds[1] == row_start]
+            polygons = _merge_polygons(pending + top) + [
+                polygon for polygon in polygons if polygon[0].bounds[1] != row_start]
+
+        # Keep polygons on the bottom seam for the next strip
+        if row_stop < height:
+            pending = [polygon for polygon in polygons if polygon[0].bounds[3] == row_stop]
+            polygons = [polygon for polygon in polygons if polygon[0].bounds[3] != row_stop]
+        finish(polygons, part)
+
+    if out_path is not None:
+        return out_path
+    gdf = gpd.GeoDataFrame(pd.concat(gdfs, ignore_index=True), crs=crs)
 
-    # Vectorize DataArray.
-    # Mask the DataArray to get only the valid data
-    mask = data_array.notnull()
-
-    # Use shapes to convert the DataArray to GeoJSON-like features.
-    shapes_gen = shapes(data_array.values, mask=mask.values, transform=data_array.rio.transform())
+    return gdf
 
-    # Convert shapes to a GeoDataFrame
-    geoms = list(shapes_gen)
-    gdf = gpd.GeoDataFrame.from_features([{'geometry': geom, 'properties': {'value': value}} for geom, value in geoms])
-    # Set the CRS for the GeoDataFrame:
+# gdf = da2gdf(data_array)
+# da2gdf(suitability_da, block_size=1024, bins=10, out_path='suitability_polygons')
 
-    gdf.set_crs(data_array.rio.crs, inplace=True)
+def _block_shapes(values, row_offset=0, edges=None):
+    """
+    Polygons of equal values in a block, in pixel coordinates of the raster (internal).
 
-    return gdf
+    Args:
+        values (array): 2-D block of values; NaN cells are skipped
+        row_offset (int): row of the raster where the block starts
+        edges (array, optional): bin edges to quantize values to their lower edge
+    Returns:
+        polygons (list of tuple): (shapely geometry, value) pairs
+    """
+    import numpy as np
+    from affine import Affine
+    from rasterio.features import shapes
+    from shapely.geometry import shape
+
+    mask = ~np.isnan(values) if np.issubdtype(values.dtype, np.floating) else None
+    if edges is not None:
+        # Bin index of each cell, as rasterio cannot vectorize float64
+        values = np.clip(
+            np.digitize(values, edges[1:-1]), 0, len(edges) - 2).astype('int32')
+    shapes_gen = shapes(values, mask=mask, transform=Affine.translation(0, row_offset))
+    if edges is None:
+        return [(shape(geom), value) for geom, value in shapes_gen]
+    return [(shape(geom), float(edges[int(value)])) for geom, value in shapes_gen]
+
+def _merge_polygons(polygons):
+    """
+    Merge polygons with the same value that share an edge (internal).
 
-# gdf = da2gdf(data_array)
+    Args:
+        polygons (list of tuple): (shapely geometry, value) pairs
+    Returns:
+        polygons (list of tuple): merged (shapely geometry, value) pairs
+    """
+    from shapely.ops import unary_union
+
+    by_value = {}
+    for geom, value in polygons:
+        by_value.setdefault(value, []).append(geom)
+
+    merged = []
+    for value, geoms in by_value.items():
+        union = unary_union(geoms)
+        # Polygons meeting only at a corner stay apart
+        for part in getattr(union, 'geoms', [union]):
+            merged.append((part, value))
+    return merged
 
 def da_combine(da1, da2, titles = ["RCP45","RCP85"], new_dim='rcp', contrast=True):
     """
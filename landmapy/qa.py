@@ -0,0 +1,63 @@
+"""
+QA Functions.
+
+bitmask: Integer with the given bits set
+qa_mask: Boolean mask of pixels with none of the given QA bits set
+"""
+# HLS Fmask bits masked by default: cloud, adjacent to cloud or shadow, cloud shadow.
+FMASK_BITS = (1, 2, 3)
+
+def bitmask(bits):
+    """
+    Integer with the given bits set.
+
+    Args:
+        bits (list of int): bit indices, least significant bit first as in the HLS user guide
+    Returns:
+        mask (int): sum of `2**bit` over `bits`
+    """
+    mask = 0
+    for bit in bits:
+        mask |= 1 << int(bit)
+    return mask
+
+# bitmask([1, 2, 3, 5]) # 46
+
+def qa_mask(qa, bits=FMASK_BITS, lut=False):
+    """
+    Boolean mask of pixels with none of the given QA bits set.
+
+    All bits are tested at once with a single `&` against `bitmask(bits)`,
+    or with `lut=True` by indexing a 256-entry lookup table (8-bit QA only).
+    No per-bit axis is built, so the mask is one byte per pixel.
+    Works on numpy and dask arrays and on DataArrays, keeping their type;
+    dask arrays are decoded chunk by chunk.
+
+    Args:
+        qa (array or da): QA values such as an HLS Fmask
+        bits (list of int, optional): bits that mark a pixel as bad
+        lut (bool, optional): When True, use a lookup table instead of `&`
+    Returns:
+        mask (array or da): True where none of `bits` are set (pixels to keep)
+    """
+    import numpy as np
+
+    mask = bitmask(bits)
+    if not lut:
+        return (qa.astype('uint8' if mask < 2**8 else 'uint16') & mask) == 0
+
+    table = (np.arange(2**8, dtype='uint8') & mask) == 0
+
+    def lookup(values):
+        """Look up each 8-bit value in the table."""
+        return table[np.asarray(values).astype('uint8')]
+
+    if hasattr(qa, 'dims'):
+        import xarray as xr
+        return xr.apply_ufunc(lookup, qa, dask='parallelized', output_dtypes=[bool])
+    if hasattr(qa, 'map_blocks'):
+        return qa.map_blocks(lookup, dtype=bool)
+    return lookup(qa)
+
+# cloud_mask = qa_mask(fmask_da, [1, 2, 3, 5])
+# band_da.where(cloud_mask)
@@ -8,6 +8,7 @@ merge_and_composite_arrays: Merge and Composite Arrays
 reflectance_kmeans: KMeans Clusters for Reflectance Bands
 reflectance_range: Check ranges of bands
 reflectance_rgb: RGB saturation of reflectance
+warm_delta_cache: Pre-populate the cache for HU2 regions and watersheds
 """
 def read_wbd_file(wbd_filename, huc_level=12, cache_key=None,
                   func_key='wbd_08', override=False):
@@ -97,89 +98,116 @@ def read_delta_gdf(huc_level=12, huc_region='08', watershed='080902030506',
 
 def compute_reflectance_da(search_results, boundary_gdf,
                            func_key='delta_reflectance_da_df',
-                           override=False):
+                           override=False, hash_args=None,
+                           io_workers=4, compute_workers=2, max_queue=8):
     """
     Compute reflectance as DataArray.
     
     Connects to files over VSI, crop, cloud mask, and wrangle.
     Returns a single reflectance DataFrame with all bands as columns
     and centroid coordinates and datetime as the index.
+    Granules run through a `pipeline`: I/O workers read the cropped Fmask
+    and bands of upcoming granules while compute workers mask and scale
+    the ones already read.
+    With a preview factor (see `initial.set_preview`), rasters are read at
+    reduced resolution and cached under `{func_key}_preview{factor}`.
+    Cache keys include a fingerprint of this code, `qa_mask` and `FMASK_BITS`
+    (see `cached.code_fingerprint`), so a change to the masked bits
+    or the scale factor recomputes rather than loading old results.
     
     Args:
-        file_df (df): File connection and metadata (datetime, tile_id, band, and url)
+        search_results (list or df): granules from `search_earthaccess`, or a link table
+            (datetime, tile_id, band, and url) such as from `granule_links`
         boundary_gdf (gdf): Boundary use to crop the data
         func_key (str, optional): File basename used to save pickled results
         override (bool, optional): When True, re-compute even if the results are already stored
+        hash_args (bool, optional): When True, key cached results on a hash of
+            `search_results` and `boundary_gdf`
+        io_workers (int, optional): number of granules read at once
+        compute_workers (int, optional): number of granules masked at once
+        max_queue (int, optional): largest number of granules held in memory
     Returns:
         granule_da_df (df): Single granule reflectance
     """
     from landmapy.cached import cached
+    from landmapy.qa import qa_mask, FMASK_BITS
 
-    @cached(func_key, override)
+    func_key = _preview_key(func_key)
+
+    @cached(func_key, override, hash_args, versioned=True,
+            depends=[qa_mask, FMASK_BITS])
     def compute_reflectance_cached(search_results, boundary_gdf):
         """Internal compute reflectance decorated function."""
-        from landmapy.earthaccess import get_earthaccess_links
-        import rioxarray as rxr
-        import numpy as np
+        from landmapy.earthaccess import earthaccess_login, get_earthaccess_links
+        from landmapy.pipeline import pipeline
+        from landmapy.process import open_raster
         import pandas as pd
         from tqdm.notebook import tqdm
 
-        def open_dataarray(url, boundary_proj_gdf, scale=1, masked=True):
-            """Open masked DataArray."""
-            da = rxr.open_rasterio(url, masked=masked).squeeze() * scale
+        def open_dataarray(url, masked=True, overviews=True):
+            """Open, crop and load masked DataArray."""
+            da = open_raster(url, overviews=overviews, masked=masked).squeeze()
             
-            # Reproject boundary if needed
-            if boundary_proj_gdf is None:
-                boundary_proj_gdf = boundary_gdf.to_crs(da.rio.crs)
+            # Reproject boundary to the raster CRS
+            boundary_proj_gdf = boundary_gdf.to_crs(da.rio.crs)
                 
             # Crop
             cropped = da.rio.clip_box(*boundary_proj_gdf.total_bounds)
-            return cropped
-        
-        def compute_quality_mask(da, mask_bits=[1, 2, 3]):
-            """Mask out low quality data by bit."""
-            # Unpack bits into a new axis
-            bits = (
-                np.unpackbits(
-                    da.astype(np.uint8), bitorder='little'
-                ).reshape(da.shape + (-1,))
-            )
-
-            # Select the required bits and check if any are flagged
-            mask = np.prod(bits[..., mask_bits]==0, axis=-1)
-            return mask
-
-        file_df = get_earthaccess_links(search_results)
+            return cropped.load()
         
-        granule_da_rows= []
-        boundary_proj_gdf = None
-
-        # Loop through each image
-        group_iter = file_df.groupby(['datetime', 'tile_id'])
-        for (datetime, tile_id), granule_df in tqdm(group_iter):
+        def read_granule(granule):
+            """I/O step: open and crop the cloud mask and bands of a granule."""
+            (datetime, tile_id), granule_df = granule
             print(f'Processing granule {tile_id} {datetime}')
-                
+
             # Open granule cloud cover
             cloud_mask_url = (
                 granule_df.loc[granule_df.band=='Fmask', 'url']
                 .values[0])
-            cloud_mask_cropped_da = open_dataarray(cloud_mask_url, boundary_proj_gdf, masked=False)
+            # No overviews: averaging would corrupt the Fmask bits
+            cloud_mask_cropped_da = open_dataarray(
+                cloud_mask_url, masked=False, overviews=False)
+
+            # Open and crop each spectral band
+            band_rows = [
+                (row, open_dataarray(row.url))
+                for i, row in granule_df.iterrows() if row.band.startswith('B')]
+            return cloud_mask_cropped_da, band_rows
+
+        def mask_granule(granule_data):
+            """Compute step: cloud mask and scale the bands of a granule."""
+            cloud_mask_cropped_da, band_rows = granule_data
 
             # Compute cloud mask
-            cloud_mask = compute_quality_mask(cloud_mask_cropped_da)
-
-            # Loop through each spectral band
-            da_list = []
-            df_list = []
-            for i, row in granule_df.iterrows():
-                if row.band.startswith('B'):
-                    # Open, crop, and mask the band
-                    band_cropped = open_dataarray(
-                        row.url, boundary_proj_gdf, scale=0.0001)
-                    band_cropped.name = row.band
-                    # Add the DataArray to the metadata DataFrame row
-                    row['da'] = band_cropped.where(cloud_mask)
-                    granule_da_rows.append(row.to_frame().T)
+            cloud_mask = qa_mask(cloud_mask_cropped_da, FMASK_BITS)
+
+            rows = []
+            for row, band_cropped in band_rows:
+                band_cropped = band_cropped * 0.0001
+                band_cropped.name = row.band
+                # Add the DataArray to the metadata DataFrame row,
+                # with the cloud mask on the band grid
+                row['da'] = band_cropped.where(
+                    cloud_mask.reindex_like(band_cropped, method='nearest'))
+                rows.append(row.to_frame().T)
+            return rows
+
+        # Shared Earthdata login and GDAL settings for all reads
+        earthaccess_login()
+        if isinstance(search_results, pd.DataFrame):
+            file_df = search_results
+        else:
+            file_df = get_earthaccess_links(search_results)
+        
+        granule_da_rows= []
+
+        # Read upcoming granules while masking earlier ones
+        group_iter = file_df.groupby(['datetime', 'tile_id'])
+        for rows in tqdm(
+                pipeline(group_iter, read_granule, mask_granule,
+                         io_workers, compute_workers, max_queue),
+                total=group_iter.ngroups):
+            granule_da_rows.extend(rows)
         
         # Reassemble the metadata DataFrame
         return pd.concat(granule_da_rows)
@@ -190,20 +218,30 @@ def compute_reflectance_da(search_results, boundary_gdf,
 
 def merge_and_composite_arrays(granule_da_df,
                                func_key='delta_reflectance_da',
-                               override=False):
+                               override=False, hash_args=None, lazy=True):
     """
     Merge and Composite Arrays.
 
+    With a preview factor (see `initial.set_preview`),
+    results are cached under `{func_key}_preview{factor}`.
+    Cache keys include a fingerprint of this code, so a changed
+    merge or composite recomputes rather than loading old results.
+
     Args:
         granule_da_df (df): dataframe with granule information
         func_key (str, optional): File basename used to save pickled results
         override (bool, optional): When True, re-compute even if the results are already stored
+        hash_args (bool, optional): When True, key cached results on a hash of `granule_da_df`
+        lazy (bool, optional): When True, a reopened cached composite is read
+            block by block as needed rather than loaded into memory
     Returns:
         da: data array with merged band information
     """
     from landmapy.cached import cached
 
-    @cached(func_key, override)
+    func_key = _preview_key(func_key)
+
+    @cached(func_key, override, hash_args, lazy=lazy, versioned=True)
     def merge_and_composite_cached(granule_da_df):
         """Internal Merge and Composite Arrays decorated function."""
         from tqdm.notebook import tqdm
@@ -246,11 +284,13 @@ def reflectance_kmeans(reflectance_da):
     import pandas as pd
     from sklearn.cluster import KMeans
 
+    # Drop bands 10,11 before reading, so lazy arrays skip them.
+    reflectance_da = reflectance_da.drop_sel(band=[10, 11])
     # Convert spectral DataArray to a tidy DataFrame
     # Each band gets its own column.
     model_df = reflectance_da.to_dataframe().reflectance.unstack('band')
-    # Drop bands 10,11 and NA values.
-    model_df = model_df.drop(columns=[10, 11]).dropna()
+    # Drop NA values.
+    model_df = model_df.dropna()
 
     # Running the fit and predict functions at the same time.
     # We can do this since we don't have target data.
@@ -296,3 +336,80 @@ def reflectance_rgb(reflectance_da):
     return rgb_sat
 
 # rgb_sat = reflectance_rgb(reflectance_da)
+
+def warm_delta_cache(watersheds=(), huc_regions=(), huc_level=12,
+                     dates=("2023-05", "2023-09"), composite=True,
+                     max_workers=4):
+    """
+    Pre-populate the cache for HU2 regions and watersheds.
+
+    WBD files for the HU2 regions (including those of the watersheds)
+    are read first, then each watershed is searched and its reflectance
+    computed in parallel.
+    Reflectance results are keyed on their arguments (`hash_args=True`),
+    so later calls must pass `hash_args=True` to find them.
+
+    Args:
+        watersheds (list of str): watershed IDs; the HU2 region is the first two digits
+        huc_regions (list of str): further HU2 regions to read
+        huc_level (int): HUC level
+        dates (tuple, optional): Inclusive dates for `search_earthaccess`
+        composite (bool, optional): When True, also cache the merged composite
+        max_workers (int, optional): number of tasks to run at once
+    Returns:
+        report_df (df): one row per task with name, status, seconds and error
+    """
+    import pandas as pd
+    from landmapy.cached import warm_cache
+
+    regions = sorted(set(huc_regions) | {watershed[:2] for watershed in watersheds})
+    wbd_tasks = [
+        dict(name=f'wbd_{region}', function=read_wbd_file,
+             args=(f"WBD_{region}_HU2_Shape", huc_level),
+             kwargs=dict(cache_key=f'hu{huc_level}', func_key=f'wbd_{region}'))
+        for region in regions]
+    reflectance_tasks = [
+        dict(name=watershed, function=_warm_watershed,
+             args=(watershed, huc_level, dates, composite))
+        for watershed in watersheds]
+
+    report_df = pd.concat([
+        warm_cache(wbd_tasks, max_workers),
+        warm_cache(reflectance_tasks, max_workers)]).reset_index(drop=True)
+    return report_df
+
+# report_df = warm_delta_cache(['080902030506', '080902030507'])
+
+def _warm_watershed(watershed, huc_level, dates, composite):
+    """
+    Search and compute reflectance for one watershed (internal).
+
+    Args:
+        watershed (str): watershed ID
+        huc_level (int): HUC level
+        dates (tuple): Inclusive dates for `search_earthaccess`
+        composite (bool): When True, also cache the merged composite
+    """
+    from landmapy.earthaccess import search_earthaccess
+
+    delta_gdf = read_delta_gdf(huc_level, watershed[:2], watershed)
+    results = search_earthaccess(delta_gdf, dates)
+    granule_da_df = compute_reflectance_da(results, delta_gdf, hash_args=True)
+    if composite:
+        merge_and_composite_arrays(granule_da_df, hash_args=True)
+
+def _preview_key(func_key):
+    """
+    Cache key with the preview factor, if any (internal).
+
+    Args:
+        func_key (str): File basename used to save pickled results
+    Returns:
+        func_key (str): `{func_key}_preview{factor}` when previewing
+    """
+    from landmapy.initial import get_preview
+
+    factor = get_preview()
+    if factor > 1:
+        func_key = f'{func_key}_preview{factor}'
+    return func_key
@@ -1,83 +1,248 @@
 """
 SRTM Functions.
 
+srtm_tiles: Names of 1 degree SRTMGL1 tiles covering bounds
 srtm_download: Download SRTM data and create DataArray
+srtm_vrt: Write a GDAL VRT mosaic over SRTM tiles
 srtm_slope: Calculate slope from SRTM data
 """
-def srtm_download(place_gdf, elevation_dir, buffer = 0.1):
+def srtm_tiles(bounds):
+    """
+    Names of 1 degree SRTMGL1 tiles covering bounds.
+
+    Tiles are named by their south-west corner, as in 'N40W105'.
+
+    Args:
+        bounds (tuple): (min_lon, min_lat, max_lon, max_lat) in degrees
+    Returns:
+        tile_names (list of str): tile names
+    """
+    from math import floor, ceil
+
+    min_lon, min_lat, max_lon, max_lat = bounds
+    tile_names = []
+    for lat in range(floor(min_lat), max(ceil(max_lat), floor(min_lat) + 1)):
+        for lon in range(floor(min_lon), max(ceil(max_lon), floor(min_lon) + 1)):
+            tile_names.append(
+                f"{'N' if lat >= 0 else 'S'}{abs(lat):02d}"
+                f"{'E' if lon >= 0 else 'W'}{abs(lon):03d}")
+    return tile_names
+
+# srtm_tiles((-105.3, 39.9, -104.6, 40.2))
+
+def srtm_download(place_gdf, elevation_dir=None, buffer = 0.1, vrt=False,
+                  chunks=None):
     """
     Download SRTM data and create DataArray.
 
+    Only the 1 degree tiles covering the buffered bounds are used.
+    Tiles already in `elevation_dir` are reused, missing ones are downloaded,
+    and tiles with no SRTM data (open ocean) are remembered in
+    `srtm_absent.txt` so they are not searched for again.
+    With `vrt=True`, tiles are not merged in memory: a GDAL VRT mosaic
+    is opened as a dask-chunked DataArray and clipped lazily,
+    so only the blocks used are read.
+    Tiles are read at the preview factor of `initial.set_preview`, if set.
+
     Parameters
     ----------
     place_gdf: GeoDataFrame
       GeoDataFrame for redlined city
     elevation_dir: character string
-      Name of directory with elevation data
+      Name of directory with elevation data, shared across places
+      (default `srtm` in the data directory)
     buffer: number
       Buffer around bounds of place_gdf
+    vrt: bool
+      When True, return a lazy, chunked DataArray over a VRT mosaic
+    chunks: dict
+      Chunks for the VRT mode (default 1024 x 1024 if dask is installed)
     Results
     -------
     srtm_da: DataArray
       DataArray of SRTM stuff
     """
     import os
+    import hashlib
     import earthaccess
+    from landmapy.earthaccess import earthaccess_login
     from glob import glob
-    import xrspatial
-    import rioxarray as rxr
+    from importlib.util import find_spec
     import rioxarray.merge as rxrmerge
-    from landmapy.process import clip_gdf_da_bounds
+    from landmapy.initial import create_data_dir
+    from landmapy.process import clip_gdf_da_bounds, open_raster
 
-    # Get bounds from gdf.
-    bounds = place_gdf.total_bounds
+    if elevation_dir is None:
+        elevation_dir = create_data_dir('srtm')
+
+    # Get bounds from gdf, in degrees as the tiles are.
+    bounds = place_gdf.to_crs(4326).total_bounds
     bounds = bounds + [x * buffer for x in [-1,-1,1,1]] # buffer around place_gdf
     bounds = tuple(bounds)
 
-    # This gets list of granules. Only need to do once.
-    srtm_pattern = os.path.join(elevation_dir, '*.hgt.zip')
-    if(not glob(srtm_pattern)):
-        earthaccess.login()
+    def tile_paths():
+        """Stored tiles by name."""
+        return {
+            tile_name: glob(os.path.join(elevation_dir, f'{tile_name}*.hgt.zip'))
+            for tile_name in srtm_tiles(bounds)}
+
+    # Tiles known to have no data
+    absent_path = os.path.join(elevation_dir, 'srtm_absent.txt')
+    absent = set()
+    if os.path.exists(absent_path):
+        with open(absent_path) as file:
+            absent = set(file.read().split())
+
+    # Download only the missing tiles.
+    missing = [tile_name for tile_name, paths in tile_paths().items()
+               if not paths and tile_name not in absent]
+    if missing:
+        earthaccess_login()
         srtm_results = earthaccess.search_data(
             short_name = 'SRTMGL1',
             bounding_box = bounds
         )
-        srtm_results = earthaccess.download(srtm_results, elevation_dir)
+        # Tiles listed in the search results
+        listed = {tile_name for granule in srtm_results
+                  for link in granule.data_links()
+                  for tile_name in missing if tile_name in link}
+        wanted = [
+            granule for granule in srtm_results
+            if any(tile_name in link
+                   for link in granule.data_links() for tile_name in missing)]
+        if wanted:
+            earthaccess.download(wanted, elevation_dir)
 
-    srtm_da_list = []
-    for srtm_path in glob(srtm_pattern):
-        tile_da = rxr.open_rasterio(srtm_path, mask_and_scale=True).squeeze()
-        tile_da = tile_da.rio.clip_box(*bounds)
-        srtm_da_list.append(tile_da)
+        # Remember tiles with no data: those a non-empty search did not list.
+        # Failed downloads, or an empty search, are tried again next time.
+        if srtm_results:
+            absent |= set(missing) - listed
+            with open(absent_path, 'w') as file:
+                file.write('\n'.join(sorted(absent)))
 
-    srtm_da = rxrmerge.merge_arrays(srtm_da_list)
+    srtm_paths = [paths[0] for paths in tile_paths().values() if paths]
+    if vrt:
+        # Lazy mosaic: read only the clipped window, block by block
+        tile_key = hashlib.sha256(' '.join(sorted(srtm_paths)).encode()).hexdigest()
+        vrt_path = srtm_vrt(
+            srtm_paths, os.path.join(elevation_dir, f'srtm_{tile_key[:16]}.vrt'))
+        if chunks is None and find_spec('dask') is not None:
+            chunks = {'x': 1024, 'y': 1024}
+        srtm_da = open_raster(
+            vrt_path, mask_and_scale=True, chunks=chunks).squeeze()
+        srtm_da = srtm_da.rio.clip_box(*bounds)
+    else:
+        srtm_da_list = []
+        for srtm_path in srtm_paths:
+            tile_da = open_raster(srtm_path, mask_and_scale=True).squeeze()
+            tile_da = tile_da.rio.clip_box(*bounds)
+            srtm_da_list.append(tile_da)
+
+        srtm_da = rxrmerge.merge_arrays(srtm_da_list)
     # Make sure we are bounding properly.
     srtm_da = clip_gdf_da_bounds(place_gdf, srtm_da, 0.1)
 
     return srtm_da
 
 # srtm_da = srtm_download(place_gdf, elevation_dir, 0.1)
+# srtm_da = srtm_download(place_gdf, elevation_dir, 0.1, vrt=True)
+
+def srtm_vrt(srtm_paths, vrt_path):
+    """
+    Write a GDAL VRT mosaic over SRTM tiles.
+
+    The VRT only references the tiles, so building it reads no pixels.
+    It is written to a temporary file and renamed into place,
+    so concurrent readers of a shared tile store see an old or a whole VRT.
+    Tiles must share CRS, data type and resolution, as SRTMGL1 tiles do.
+
+    Args:
+        srtm_paths (list of str): paths to tiles (such as '*.hgt.zip')
+        vrt_path (str): path of VRT file to write
+    Returns:
+        vrt_path (str): path of VRT file
+    """
+    import os
+    import uuid
+    import rasterio
+    from xml.sax.saxutils import escape
+
+    gdal_types = {'uint8': 'Byte', 'int16': 'Int16', 'uint16': 'UInt16',
+                  'int32': 'Int32', 'float32': 'Float32', 'float64': 'Float64'}
+
+    tiles = []
+    for srtm_path in srtm_paths:
+        with rasterio.open(srtm_path) as src:
+            tiles.append(dict(
+                path=os.path.abspath(srtm_path), bounds=src.bounds,
+                width=src.width, height=src.height, res=src.res,
+                crs=src.crs, nodata=src.nodata, dtype=src.dtypes[0]))
+
+    # Mosaic extent on the grid of the first tile
+    res_x, res_y = tiles[0]['res']
+    min_x = min(tile['bounds'].left for tile in tiles)
+    max_y = max(tile['bounds'].top for tile in tiles)
+    width = round((max(tile['bounds'].right for tile in tiles) - min_x) / res_x)
+    height = round((max_y - min(tile['bounds'].bottom for tile in tiles)) / res_y)
+    nodata = tiles[0]['nodata']
+    nodata_xml = '' if nodata is None else f'<NoDataValue>{nodata:g}</NoDataValue>'
+
+    sources = []
+    for tile in tiles:
+        x_off = round((tile['bounds'].left - min_x) / res_x)
+        y_off = round((max_y - tile['bounds'].top) / res_y)
+        sources.append(
+            '    <ComplexSource>\n'
+            f'      <SourceFilename relativeToVRT="0">{escape(tile["path"])}</SourceFilename>\n'
+            '      <SourceBand>1</SourceBand>\n'
+            f'      <SrcRect xOff="0" yOff="0" xSize="{tile["width"]}" ySize="{tile["height"]}"/>\n'
+            f'      <DstRect xOff="{x_off}" yOff="{y_off}" xSize="{tile["width"]}" ySize="{tile["height"]}"/>\n'
+            + ('' if nodata is None else f'      <NODATA>{nodata:g}</NODATA>\n')
+            + '    </ComplexSource>\n')
+
+    vrt_xml = (
+        f'<VRTDataset rasterXSize="{width}" rasterYSize="{height}">\n'
+        f'  <SRS>{escape(tiles[0]["crs"].to_wkt())}</SRS>\n'
+        f'  <GeoTransform>{min_x!r}, {res_x!r}, 0, {max_y!r}, 0, {-res_y!r}</GeoTransform>\n'
+        f'  <VRTRasterBand dataType="{gdal_types[tiles[0]["dtype"]]}" band="1">\n'
+        f'    {nodata_xml}\n'
+        + ''.join(sources)
+        + '  </VRTRasterBand>\n'
+        '</VRTDataset>\n')
+    # Write beside the target and swap it in, so readers never see a partial file
+    temp_path = f'{vrt_path}.{uuid.uuid4().hex}.tmp'
+    with open(temp_path, 'w') as file:
+        file.write(vrt_xml)
+    os.replace(temp_path, vrt_path)
+    return vrt_path
+
+# vrt_path = srtm_vrt(glob(os.path.join(elevation_dir, '*.hgt.zip')), 'srtm.vrt')
 # srtm_da.plot(cmap='terrain')
 
-def srtm_slope(srtm_da, UTM = 32613):
+def srtm_slope(srtm_da, UTM = None):
     """
     Calculate slope from SRTM data.
 
     Project to UTM to calculate slope, then project back.
+    For several derivatives at once over large regions,
+    use `landmapy.terrain.terrain_derivatives`.
 
     Args:
         srtm_da (da): da with elevation information
-        UTM (int or char): UTM value (default is for UTM13N)
+        UTM (int or char): UTM value (default is the zone at the center of srtm_da)
     Returns:
         slope_da (da): da with slopes (may be slightly different shape from srtm_da)
     """
     import xrspatial
     import rioxarray as rxr
+    from landmapy.terrain import utm_crs
 
+    if UTM is None:
+        UTM = utm_crs(srtm_da)
     orig_crs = srtm_da.rio.crs
     srtm_utm_da = srtm_da.rio.reproject(UTM)
     slope_da = xrspatial.slope(srtm_utm_da).rio.reproject(orig_crs)
     
     return slope_da
 
-# slope_da = srtm_slope(srtm_da, 32613)
+# slope_da = srtm_slope(srtm_da)
@@ -0,0 +1,151 @@
+"""
+Terrain Functions.
+
+utm_crs: UTM CRS for the center of a DataArray
+terrain_derivatives: Slope, aspect, hillshade and curvature in one pass
+"""
+# Derivatives computed by `terrain_derivatives`, in output order.
+DERIVATIVES = ('slope', 'aspect', 'hillshade', 'curvature')
+
+def utm_crs(da):
+    """
+    UTM CRS for the center of a DataArray.
+
+    Args:
+        da (da): DataArray with a CRS
+    Returns:
+        crs (CRS): UTM zone CRS, north or south
+    """
+    return da.rio.estimate_utm_crs()
+
+# crs = utm_crs(srtm_da)
+
+def terrain_derivatives(dem_da, derivatives=DERIVATIVES, crs=None, chunks=None,
+                        reproject_back=True, azimuth=315, altitude=45):
+    """
+    Slope, aspect, hillshade and curvature in one pass.
+
+    The DEM is reprojected once to a metric CRS (the UTM zone of its center
+    unless `crs` is given), all derivatives are computed together from
+    the same 3 x 3 neighborhoods, and the stacked result is reprojected
+    back once if `reproject_back`.
+    With dask, blocks are processed in parallel with a one-pixel halo
+    shared from neighboring blocks, so block seams match a whole-array pass.
+    Slope and aspect use Horn's method in degrees (aspect clockwise from north,
+    -1 where flat), hillshade is 0-255, and curvature is in 1/100 units of z,
+    following the ESRI and `xrspatial` conventions.
+    Edge pixels of the DEM are NaN.
+    Only the derivative step is chunked: `rio.reproject` is not lazy,
+    so the reprojected DEM and, with `reproject_back`, the stacked result
+    are each held in memory in full. Clip `dem_da` to the area of interest
+    first, or pass `reproject_back=False` and keep the result in `crs`.
+
+    Args:
+        dem_da (da): 2-D DataArray of elevation in meters
+        derivatives (list of str, optional): names from `DERIVATIVES`
+        crs (int or str or CRS, optional): metric CRS to compute in
+        chunks (dict, optional): dask chunks (default 2048 x 2048 if dask is installed)
+        reproject_back (bool, optional): When True, return in the CRS of `dem_da`
+        azimuth (float, optional): sun azimuth in degrees for hillshade
+        altitude (float, optional): sun altitude in degrees for hillshade
+    Returns:
+        terrain_ds (ds): Dataset with one variable per derivative
+    """
+    import numpy as np
+    import xarray as xr
+    from importlib.util import find_spec
+
+    unknown = set(derivatives) - set(DERIVATIVES)
+    if unknown:
+        raise ValueError(f'Unknown derivatives {sorted(unknown)}')
+    derivatives = list(derivatives)
+
+    # The one reprojection to a metric CRS (loads the whole DEM)
+    orig_crs = dem_da.rio.crs
+    if crs is None:
+        crs = utm_crs(dem_da)
+    dem_utm_da = dem_da.rio.reproject(crs).astype('float32')
+    res_x, res_y = (abs(res) for res in dem_utm_da.rio.resolution())
+    options = dict(res_x=res_x, res_y=res_y, derivatives=derivatives,
+                   azimuth=azimuth, altitude=altitude)
+
+    if chunks is None and find_spec('dask') is not None:
+        chunks = {'x': 2048, 'y': 2048}
+    if chunks:
+        import dask.array
+
+        z = dem_utm_da.chunk(chunks).data
+        # Halo of one pixel; the block function returns the interior only.
+        data = dask.array.map_overlap(
+            _terrain_block, z, depth=1, boundary=np.nan, trim=False,
+            new_axis=0, chunks=((len(derivatives),),) + z.chunks,
+            dtype='float32', **options)
+    else:
+        z = np.pad(dem_utm_da.values, 1, constant_values=np.nan)
+        data = _terrain_block(z, **options)
+
+    terrain_da = xr.DataArray(
+        data, dims=('derivative', *dem_utm_da.dims),
+        coords=dict(dem_utm_da.coords, derivative=derivatives))
+    terrain_da = terrain_da.rio.write_crs(crs).rio.write_nodata(np.nan)
+
+    # Reproject all derivatives back together (computes them all)
+    if reproject_back:
+        terrain_da = terrain_da.rio.reproject(orig_crs)
+
+    return terrain_da.to_dataset(dim='derivative')
+
+# terrain_ds = terrain_derivatives(srtm_da)
+# terrain_ds.slope.plot()
+
+def _terrain_block(z, res_x, res_y, derivatives=DERIVATIVES,
+                   azimuth=315, altitude=45):
+    """
+    Terrain derivatives of the interior of a block with a one-pixel halo (internal).
+
+    Args:
+        z (array): 2-D elevation with one extra pixel on each side
+        res_x, res_y (float): cell sizes in meters
+        derivatives (list of str): names from `DERIVATIVES`
+        azimuth, altitude (float): sun position in degrees for hillshade
+    Returns:
+        stack (array): derivatives stacked on a new first axis, shape of interior
+    """
+    import numpy as np
+
+    # 3 x 3 neighborhood, row by row from the north-west corner
+    a, b, c = z[:-2, :-2], z[:-2, 1:-1], z[:-2, 2:]
+    d, e, f = z[1:-1, :-2], z[1:-1, 1:-1], z[1:-1, 2:]
+    g, h, i = z[2:, :-2], z[2:, 1:-1], z[2:, 2:]
+
+    with np.errstate(invalid='ignore'):
+        # Horn's method gradients, shared by slope, aspect and hillshade
+        dz_dx = ((c + 2 * f + i) - (a + 2 * d + g)) / (8 * res_x)
+        dz_dy = ((g + 2 * h + i) - (a + 2 * b + c)) / (8 * res_y)
+        slope_rad = np.arctan(np.hypot(dz_dx, dz_dy))
+        aspect_rad = np.arctan2(dz_dy, -dz_dx)
+        flat = (dz_dx == 0) & (dz_dy == 0)
+
+        results = {}
+        if 'slope' in derivatives:
+            results['slope'] = np.degrees(slope_rad)
+        if 'aspect' in derivatives:
+            # Compass bearing from the math angle
+            aspect = 90 - np.degrees(aspect_rad)
+            aspect = np.where(aspect < 0, aspect + 360, aspect)
+            results['aspect'] = np.where(flat, -1, aspect)
+        if 'hillshade' in derivatives:
+            zenith_rad = np.radians(90 - altitude)
+            azimuth_rad = np.radians((360 - azimuth + 90) % 360)
+            hillshade = 255 * (
+                np.cos(zenith_rad) * np.cos(slope_rad)
+                + np.sin(zenith_rad) * np.sin(slope_rad)
+                * np.cos(azimuth_rad - aspect_rad))
+            results['hillshade'] = np.clip(hillshade, 0, 255)
+        if 'curvature' in derivatives:
+            d2z_dx2 = ((d + f) / 2 - e) / res_x**2
+            d2z_dy2 = ((b + h) / 2 - e) / res_y**2
+            results['curvature'] = -2 * (d2z_dx2 + d2z_dy2) * 100
+
+    return np.stack(
+        [results[name] for name in derivatives]).astype('float32')
@@ -2,24 +2,23 @@
 """USGS Water Data Access
 
 This module provides functions to access and visualize data from the USGS Water Data initiative.
+Plotting and data-access libraries are imported inside each function,
+so importing this module stays fast for workers that only fetch data.
 """
 
-import dataretrieval.nwis as nwis
-import pandas as pd
-import numpy as np
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import hvplot.pandas  # This activates .hvplot() on DataFrames
-import holoviews as hv
-from IPython.display import display
-import contextily as cx
+def _bokeh_extension():
+    """
+    Initialize HoloViews extension for Bokeh on first interactive plot (internal).
+    """
+    import holoviews as hv
 
-# Initialize HoloViews extension for Bokeh
-try:
-    hv.extension('bokeh')
-except Exception:
-    # Fallback or ignore if not in an environment that supports it
-    pass
+    if not getattr(_bokeh_extension, 'done', False):
+        try:
+            hv.extension('bokeh')
+        except Exception:
+            # Fallback or ignore if not in an environment that supports it
+            pass
+        _bokeh_extension.done = True
 
 def hvplot_usgs_map(site_id, site_name, latitude, longitude):
     """
@@ -31,6 +30,13 @@ def hvplot_usgs_map(site_id, site_name, latitude, longitude):
         latitude (float): Latitude of the station.
         longitude (float): Longitude of the station.
     """
+    import pandas as pd
+    import geopandas as gpd
+    import hvplot.pandas  # This activates .hvplot() on DataFrames
+    from IPython.display import display
+
+    _bokeh_extension()
+
     # Coordinates for USGS station
     data = {
         "Site": [site_id],
@@ -76,6 +82,11 @@ def plot_usgs_map(site_id, site_name, latitude, longitude):
         latitude (float): Latitude of the station.
         longitude (float): Longitude of the station.
     """
+    import pandas as pd
+    import geopandas as gpd
+    import matplotlib.pyplot as plt
+    import contextily as cx
+
     # Coordinates for USGS station
     data = {
         "Site": [site_id],
@@ -132,7 +143,10 @@ def get_usgs_data(site_id="06446000", parameters=["00065", "00060"],
     Returns:
         pd.DataFrame: Daily resampled mean of the primary parameter (usually discharge).
     """
-    
+    import dataretrieval.nwis as nwis
+    import numpy as np
+    import pandas as pd
+
     # Create df using data from USGS
     df = nwis.get_record(sites=site_id, parameterCd=parameters, start=start_date, end=end_date)
     
@@ -140,6 +154,10 @@ def get_usgs_data(site_id="06446000", parameters=["00065", "00060"],
     df = df.replace(-999999, np.nan)
     
     if plot_series:
+        import hvplot.pandas  # This activates .hvplot() on DataFrames
+        from IPython.display import display
+        _bokeh_extension()
+
         # Determine the primary parameter code (usually discharge 00060 or gage height 00065)
         main_param = "00060" if "00060" in parameters else parameters[0]
         
@@ -179,6 +197,9 @@ def find_usgs_site(site_name, state_code):
     Returns:
         pd.DataFrame: DataFrame containing site_id, station_nm, lat, and lon.
     """
+    import dataretrieval.nwis as nwis
+    import pandas as pd
+
     # Fetch all sites in the given state
     df, meta = nwis.what_sites(stateCd=state_code)
     
@@ -206,6 +227,9 @@ def get_site_metadata(site_id):
     Returns:
         dict: Metadata containing site_id, parameters, start_date, and end_date.
     """
+    import dataretrieval.nwis as nwis
+    import pandas as pd
+
     # Fetch site series catalog
     df, meta = nwis.get_info(sites=site_id, seriesCatalogOutput=True)
     
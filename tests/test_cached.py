@@ -0,0 +1,210 @@
+import json
+
+import pytest
+
+from landmapy import cached
+
+@pytest.fixture
+def jars(tmp_path):
+    """Cache in a temporary `jars` directory with no memory tier."""
+    saved = dict(cached.CACHE_CONFIG)
+    cached.configure_cache(jars_dir=str(tmp_path), memory=False)
+    cached.clear_memory()
+    yield tmp_path
+    cached.configure_cache(**saved)
+    cached.clear_memory()
+
+@pytest.mark.parametrize('storage', ['zarr', 'netcdf'])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_xarray_round_trip(jars, storage, lazy):
+    np = pytest.importorskip('numpy')
+    xr = pytest.importorskip('xarray')
+    pytest.importorskip('rioxarray')
+    pytest.importorskip('zarr' if storage == 'zarr' else 'netCDF4')
+
+    fmask_da = xr.DataArray(
+        np.array([[1, -9999], [3, 4]], dtype='int16'), dims=('y', 'x'),
+        coords=dict(y=[1.0, 0.0], x=[0.0, 1.0]))
+    fmask_da = fmask_da.rio.write_crs(4326).rio.write_nodata(-9999)
+    named_da = (fmask_da.astype('float32') / 10).rename('red').rio.write_nodata(-1)
+
+    for name, da in [('fmask', fmask_da), ('named', named_da)]:
+        @cached.cached(name, storage=storage, lazy=lazy)
+        def compute():
+            return da
+        compute()
+        result = compute()
+        assert result.dtype == da.dtype
+        assert result.name == da.name
+        assert result.rio.nodata == da.rio.nodata
+        assert result.rio.crs == da.rio.crs
+        np.testing.assert_array_equal(result.values, da.values)
+
+def test_memory_opt_in(jars):
+    pd = pytest.importorskip('pandas')
+
+    @cached.cached('frame')
+    def compute():
+        return pd.DataFrame({'a': [1, 2]})
+
+    # Default: each call returns its own copy
+    result = compute()
+    result['b'] = 2
+    assert list(compute().columns) == ['a']
+
+    # Memory tier: the same object is shared
+    @cached.cached('frame', memory=True)
+    def compute_shared():
+        return pd.DataFrame({'a': [1, 2]})
+
+    assert compute_shared() is compute_shared()
+
+def test_sizeof_geometry_and_cells():
+    np = pytest.importorskip('numpy')
+    pd = pytest.importorskip('pandas')
+    gpd = pytest.importorskip('geopandas')
+    xr = pytest.importorskip('xarray')
+    from shapely.geometry import Point
+
+    # 40,000 x, y pairs per polygon
+    circle = Point(0, 0).buffer(1, quad_segs=10000)
+    gdf = gpd.GeoDataFrame({'name': ['a', 'b']}, geometry=[circle] * 2, crs=4326)
+    assert cached._sizeof(gdf) > 2 * 16 * 40000
+
+    band_da = xr.DataArray(np.zeros((100, 100)), dims=('y', 'x'))
+    granule_df = pd.DataFrame({'datetime': pd.to_datetime(['2023-05-01'] * 3),
+                               'da': [band_da] * 3})
+    assert cached._sizeof(granule_df) > 3 * band_da.nbytes
+
+def test_hits_logged(jars):
+    pytest.importorskip('pandas')
+
+    @cached.cached('counted')
+    def compute():
+        return [1, 2, 3]
+
+    compute()
+    compute()
+    compute()
+    manifest = json.loads((jars / cached.MANIFEST_NAME).read_text())
+    assert manifest['counted']['hits'] == 0
+    entries_df = cached.cache_entries().set_index('key')
+    assert entries_df.hits['counted'] == 2
+
+    # The next write folds the hit log into the manifest
+    @cached.cached('other')
+    def compute_other():
+        return 0
+
+    compute_other()
+    manifest = json.loads((jars / cached.MANIFEST_NAME).read_text())
+    assert manifest['counted']['hits'] == 2
+    assert not list(jars.glob(cached.HITS_NAME + '*'))
+
+def slow_square(x, counter_path):
+    """Cached compute that records each run in a file."""
+    import time
+    with open(counter_path, 'a') as file:
+        file.write('run\n')
+    time.sleep(0.5)
+    return x * x
+
+def run_slow_square(args):
+    """Run the cached `slow_square` in a worker process."""
+    jars_dir, counter_path = args
+    cached.configure_cache(jars_dir=jars_dir, memory=False)
+    return cached.cached('square')(slow_square)(3, counter_path)
+
+def test_single_flight(jars):
+    import multiprocessing
+    if cached.fcntl is None:
+        pytest.skip('no fcntl file locks')
+
+    counter_path = jars / 'runs.txt'
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        results = pool.map(run_slow_square, [(str(jars), str(counter_path))] * 4)
+    assert results == [9] * 4
+    assert counter_path.read_text().splitlines() == ['run']
+
+def test_prune_cache_order(jars):
+    import time
+    pytest.importorskip('pandas')
+
+    for name in ['a', 'b', 'c']:
+        cached.cached(name)(lambda: bytes(1000))()
+    assert (jars / '.locks' / 'a.lock').exists()
+
+    # Last access: a oldest, c newest
+    now = time.time()
+    manifest = json.loads((jars / cached.MANIFEST_NAME).read_text())
+    for name, age in [('a', 300), ('b', 200), ('c', 0)]:
+        manifest[name]['last_access'] = now - age
+    (jars / cached.MANIFEST_NAME).write_text(json.dumps(manifest))
+    size = manifest['a']['bytes']
+
+    assert list(cached.prune_cache(ttl_seconds=250, dry_run=True).key) == ['a']
+    assert list(cached.prune_cache(quota_bytes=2 * size, dry_run=True).key) == ['a']
+    assert list(cached.prune_cache(quota_bytes=size, dry_run=True).key) == ['a', 'b']
+    assert list(cached.prune_cache(quota_bytes=size, keep=['a']).key) == ['b', 'c']
+    assert list(cached.cache_entries().key) == ['a']
+    assert sorted(path.name for path in jars.glob('*.pickle')) == ['a.pickle']
+    assert not (jars / '.locks' / 'b.lock').exists()
+
+def test_hash_args_geometry_crs():
+    gpd = pytest.importorskip('geopandas')
+    from shapely.geometry import box
+
+    gdf = gpd.GeoDataFrame({'name': ['delta']}, geometry=[box(0, 0, 1, 1)], crs=4326)
+    digest = cached.cache_hash(gdf)
+    assert cached.cache_hash(gdf.copy()) == digest
+    assert cached.cache_hash(gdf.set_crs(3857, allow_override=True)) != digest
+    assert cached.cache_hash(gdf.set_geometry([box(0, 0, 1, 2)])) != digest
+    assert cached.cache_hash(gdf.assign(name='other')) != digest
+
+def test_hash_args_dataarray_cells():
+    pd = pytest.importorskip('pandas')
+    np = pytest.importorskip('numpy')
+    xr = pytest.importorskip('xarray')
+
+    def granule_df(day, value):
+        band_da = xr.DataArray(np.full((2, 2), value), dims=('y', 'x'))
+        return pd.DataFrame({
+            'datetime': [pd.Timestamp(f'2023-05-{day:02d}'), pd.NaT],
+            'delta': [pd.Timedelta(days=1)] * 2,
+            'da': [band_da, band_da]})
+
+    digest = cached.cache_hash(granule_df(1, 0.5))
+    assert cached.cache_hash(granule_df(1, 0.5)) == digest
+    assert cached.cache_hash(granule_df(2, 0.5)) != digest
+    assert cached.cache_hash(granule_df(1, 0.7)) != digest
+    assert cached.cache_hash(pd.Timestamp('2023-05-01')) != cached.cache_hash(pd.NaT)
+
+@pytest.mark.parametrize('codec', cached.CODECS)
+@pytest.mark.parametrize('storage', ['pickle', 'parquet', 'zarr'])
+def test_codec_round_trip(jars, codec, storage):
+    pytest.importorskip('zstandard' if codec == 'zstd' else 'lz4')
+    pd = pytest.importorskip('pandas')
+    np = pytest.importorskip('numpy')
+    if storage == 'parquet':
+        pytest.importorskip('pyarrow')
+        data = pd.DataFrame({'value': np.arange(1000.0), 'name': ['a'] * 1000})
+    elif storage == 'zarr':
+        xr = pytest.importorskip('xarray')
+        pytest.importorskip('zarr')
+        data = xr.DataArray(np.arange(1000.0).reshape(20, 50), dims=('y', 'x'), name='z')
+    else:
+        data = {'value': list(range(1000))}
+
+    compute = cached.cached('coded', storage=storage, codec=codec)(lambda: data)
+    compute()
+    result = compute()
+    if storage == 'parquet':
+        pd.testing.assert_frame_equal(result, data)
+    elif storage == 'zarr':
+        assert result.identical(data)
+    else:
+        assert result == data
+    entries_df = cached.cache_entries()
+    assert entries_df.file[0].startswith('coded')
+    if storage == 'pickle':
+        assert entries_df.file[0].endswith(f'.pickle.{codec[:3]}')
@@ -0,0 +1,44 @@
+import os
+import pkgutil
+import subprocess
+import sys
+
+# Root of the repository, so the package imports from source.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that must not load just by importing a landmapy module.
+HEAVY = ['dataretrieval', 'holoviews', 'hvplot', 'matplotlib', 'contextily',
+         'geopandas', 'xarray', 'rioxarray', 'earthaccess', 'earthpy']
+
+# Import budget per module in seconds.
+BUDGET = 1.0
+
+def import_time(module):
+    """Time importing a module in a fresh interpreter; also list heavy libraries loaded."""
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(','.join(name for name in {HEAVY!r} if name in sys.modules))\n")
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=ROOT,
+        capture_output=True, text=True, check=True).stdout.splitlines()
+    return float(output[0]), [name for name in output[1].split(',') if name]
+
+def landmapy_modules():
+    """Package and all its submodules."""
+    path = os.path.join(ROOT, 'landmapy')
+    return ['landmapy'] + [
+        f'landmapy.{module.name}' for module in pkgutil.iter_modules([path])]
+
+def test_import_time():
+    for module in landmapy_modules():
+        seconds, heavy = import_time(module)
+        assert seconds < BUDGET, f'{module} took {seconds:.2f} s to import'
+        assert not heavy, f'{module} imported {heavy}'
+
+if __name__ == "__main__":
+    for module in landmapy_modules():
+        seconds, heavy = import_time(module)
+        print(f"{module:24s} {seconds * 1000:8.1f} ms {' '.join(heavy)}")
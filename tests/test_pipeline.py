@@ -0,0 +1,67 @@
+import random
+import threading
+import time
+
+import pytest
+
+from landmapy.pipeline import pipeline
+
+def test_pipeline_order():
+    def read(item):
+        time.sleep(random.random() / 100)
+        return item
+
+    def compute(item):
+        time.sleep(random.random() / 100)
+        return item * item
+
+    results = list(pipeline(range(50), read, compute, io_workers=4, compute_workers=3))
+    assert results == [item * item for item in range(50)]
+
+def test_pipeline_queue_bound():
+    lock = threading.Lock()
+    counts = dict(in_flight=0, largest=0, consumed=0)
+
+    def items():
+        for item in range(40):
+            with lock:
+                counts['in_flight'] += 1
+                counts['largest'] = max(counts['largest'], counts['in_flight'])
+            yield item
+
+    for _ in pipeline(items(), lambda item: item, lambda item: item,
+                      io_workers=4, compute_workers=2, max_queue=3):
+        # Slow consumer: reads must wait for it
+        time.sleep(0.005)
+        with lock:
+            counts['in_flight'] -= 1
+            counts['consumed'] += 1
+    assert counts['consumed'] == 40
+    assert counts['largest'] <= 3
+
+def test_pipeline_exception():
+    def compute(item):
+        if item == 5:
+            raise RuntimeError('bad item')
+        return item
+
+    results = []
+    with pytest.raises(RuntimeError, match='bad item'):
+        for result in pipeline(range(10), lambda item: item, compute):
+            results.append(result)
+    assert results == [0, 1, 2, 3, 4]
+
+    def read(item):
+        if item == 2:
+            raise OSError('read failed')
+        return item
+
+    def slow_compute(item):
+        time.sleep(0.05)
+        return item
+
+    results = []
+    with pytest.raises(OSError, match='read failed'):
+        for result in pipeline(range(10), read, slow_compute):
+            results.append(result)
+    assert results == [0, 1]
@@ -0,0 +1,48 @@
+import pytest
+
+def polygon_items(gdf):
+    """(value, area, bounds) key and geometry of each polygon, sorted by key."""
+    items = [
+        ((value, round(geom.area, 9), tuple(round(bound, 9) for bound in geom.bounds)),
+         geom)
+        for geom, value in zip(gdf.geometry, gdf.value)]
+    return sorted(items, key=lambda item: item[0])
+
+def assert_same_polygons(gdf, whole_gdf):
+    """Same polygons as the whole-raster pass, up to order and vertex lists."""
+    items, whole_items = polygon_items(gdf), polygon_items(whole_gdf)
+    assert [key for key, _ in items] == [key for key, _ in whole_items]
+    for (_, geom), (_, whole_geom) in zip(items, whole_items):
+        assert geom.equals(whole_geom)
+
+@pytest.fixture
+def patchy_da():
+    """Raster of a few values in patches, with a NaN hole."""
+    np = pytest.importorskip('numpy')
+    xr = pytest.importorskip('xarray')
+    pytest.importorskip('rioxarray')
+    pytest.importorskip('geopandas')
+
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 3, (10, 8)).repeat(5, axis=0).repeat(5, axis=1)
+    values = values.astype('float32')
+    values[20:26, 10:30] = np.nan
+    return xr.DataArray(
+        values, dims=('y', 'x'),
+        coords=dict(y=np.arange(50)[::-1] + 0.5, x=np.arange(40) + 0.5))
+
+@pytest.mark.parametrize('block_size', [1, 7, 64])
+def test_da2gdf_blocks(patchy_da, block_size):
+    from landmapy.process import da2gdf
+
+    whole_gdf = da2gdf(patchy_da)
+    assert_same_polygons(da2gdf(patchy_da, block_size=block_size), whole_gdf)
+
+def test_da2gdf_out_path(patchy_da, tmp_path):
+    import geopandas as gpd
+    pytest.importorskip('pyarrow')
+    from landmapy.process import da2gdf
+
+    out_path = str(tmp_path / 'polygons')
+    assert da2gdf(patchy_da, block_size=7, out_path=out_path) == out_path
+    assert_same_polygons(gpd.read_parquet(out_path), da2gdf(patchy_da))
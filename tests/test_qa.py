@@ -0,0 +1,33 @@
+import pytest
+
+from landmapy.qa import FMASK_BITS, bitmask, qa_mask
+
+def unpacked_mask(values, bits):
+    """Reference mask: unpack every bit and check none of `bits` is set."""
+    import numpy as np
+    unpacked = np.unpackbits(
+        values.astype('uint8')[..., np.newaxis], axis=-1, bitorder='little')
+    return ~unpacked[..., list(bits)].any(axis=-1)
+
+def test_bitmask():
+    assert bitmask([1, 2, 3, 5]) == 46
+    assert bitmask([]) == 0
+
+@pytest.mark.parametrize('bits', [FMASK_BITS, (0,), (1, 2, 3, 5), range(8)])
+@pytest.mark.parametrize('lut', [False, True])
+def test_qa_mask_unpackbits(bits, lut):
+    np = pytest.importorskip('numpy')
+
+    values = np.arange(2**8, dtype='uint8').reshape(16, 16)
+    expected = unpacked_mask(values, bits)
+    np.testing.assert_array_equal(qa_mask(values, bits, lut=lut), expected)
+
+    dask_array = pytest.importorskip('dask.array')
+    result = qa_mask(dask_array.from_array(values, chunks=(5, 7)), bits, lut=lut)
+    assert isinstance(result, dask_array.Array)
+    np.testing.assert_array_equal(result.compute(), expected)
+
+    xr = pytest.importorskip('xarray')
+    result = qa_mask(xr.DataArray(values, dims=('y', 'x')).chunk(8), bits, lut=lut)
+    assert result.dims == ('y', 'x')
+    np.testing.assert_array_equal(result.values, expected)
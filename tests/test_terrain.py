@@ -0,0 +1,48 @@
+import pytest
+
+from landmapy.terrain import DERIVATIVES
+
+@pytest.fixture
+def dem_da():
+    """Synthetic 30 m DEM of smooth hills with noise, in UTM zone 10N."""
+    np = pytest.importorskip('numpy')
+    xr = pytest.importorskip('xarray')
+    pytest.importorskip('rioxarray')
+
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:60, 0:50]
+    elevation = (100 * np.sin(x / 7) * np.cos(y / 9) + 3 * x
+                 + rng.normal(0, 2, x.shape)).astype('float32')
+    dem_da = xr.DataArray(
+        elevation, dims=('y', 'x'),
+        coords=dict(y=4_000_000 - 30 * np.arange(60) - 15.0,
+                    x=500_000 + 30 * np.arange(50) + 15.0))
+    return dem_da.rio.write_crs(32610).rio.write_nodata(np.nan)
+
+@pytest.mark.parametrize('chunks', [{'x': 16, 'y': 13}, {'x': 7, 'y': 60},
+                                    {'x': 1, 'y': 60}, {'x': 50, 'y': 1}])
+def test_terrain_blocks(dem_da, chunks):
+    import numpy as np
+    pytest.importorskip('dask')
+    from landmapy.terrain import terrain_derivatives
+
+    whole_ds = terrain_derivatives(dem_da, crs=32610, chunks=False, reproject_back=False)
+    block_ds = terrain_derivatives(dem_da, crs=32610, chunks=chunks, reproject_back=False)
+    assert list(block_ds.data_vars) == list(DERIVATIVES)
+    for name in DERIVATIVES:
+        assert block_ds[name].chunks is not None
+        assert block_ds[name].shape == whole_ds[name].shape
+        np.testing.assert_allclose(
+            block_ds[name].values, whole_ds[name].values, rtol=1e-6, equal_nan=True)
+
+def test_terrain_slope_xrspatial(dem_da):
+    import numpy as np
+    xrspatial = pytest.importorskip('xrspatial')
+    from landmapy.terrain import terrain_derivatives
+
+    slope_da = terrain_derivatives(
+        dem_da, ['slope'], crs=32610, chunks=False, reproject_back=False).slope
+    expected = xrspatial.slope(dem_da.rio.reproject(32610))
+    assert slope_da.shape == expected.shape
+    assert np.isfinite(slope_da.values[1:-1, 1:-1]).all()
+    np.testing.assert_allclose(slope_da.values, expected.values, atol=1e-3, equal_nan=True)